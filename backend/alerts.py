@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+from db import claim_pending_alerts, mark_alerts_delivered, mark_alert_failed
+
+# Comma-separated notifiers that receive every alert, e.g. "file,webhook"
+ALERT_NOTIFIERS = os.getenv("ALERT_NOTIFIERS", "file")
+ALERT_FILE = os.getenv("ALERT_FILE", "alerts.jsonl")
+ALERT_WEBHOOK_URL = os.getenv("ALERT_WEBHOOK_URL", "")
+ALERT_WEBHOOK_TIMEOUT = float(os.getenv("ALERT_WEBHOOK_TIMEOUT", "5"))
+ALERT_BATCH = int(os.getenv("ALERT_BATCH", "100"))
+# A claimed alert is offered to another dispatcher if not delivered within this window
+ALERT_CLAIM_SECONDS = 60
+ALERT_RETRY_SECONDS = int(os.getenv("ALERT_RETRY_SECONDS", "300"))
+ALERT_MAX_ATTEMPTS = int(os.getenv("ALERT_MAX_ATTEMPTS", "5"))
+
+
+class FileNotifier:
+    """Appends each alert as a JSON line to a local file"""
+
+    def __init__(self, path=ALERT_FILE):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def send(self, alerts):
+        lines = "".join(json.dumps(alert, ensure_ascii=False) + "\n" for alert in alerts)
+        with self._lock, open(self._path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+
+class WebhookNotifier:
+    """POSTs each alert as JSON to a webhook URL"""
+
+    def __init__(self, url=ALERT_WEBHOOK_URL, timeout=ALERT_WEBHOOK_TIMEOUT):
+        import requests
+        self._url = url
+        self._timeout = timeout
+        self._session = requests.Session()
+
+    def send(self, alerts):
+        for alert in alerts:
+            response = self._session.post(self._url, json=alert, timeout=self._timeout)
+            response.raise_for_status()
+
+
+# Notifiers named in ALERT_NOTIFIERS, created on first dispatch
+_configured = {}
+_configured_loaded = False
+# Notifiers added in code; they replace a configured one with the same name
+_notifiers = {}
+_lock = threading.Lock()
+
+
+def register_notifier(name, notifier):
+    """Add a notifier; it needs a send(alerts) method that raises on failure"""
+    with _lock:
+        _notifiers[name] = notifier
+
+
+def _configured_notifiers():
+    global _configured_loaded
+    with _lock:
+        if not _configured_loaded:
+            for name in filter(None, (n.strip() for n in ALERT_NOTIFIERS.split(","))):
+                if name == "file":
+                    _configured[name] = FileNotifier()
+                elif name == "webhook" and ALERT_WEBHOOK_URL:
+                    _configured[name] = WebhookNotifier()
+            _configured_loaded = True
+        return list({**_configured, **_notifiers}.items())
+
+
+def dispatch_pending(limit=ALERT_BATCH):
+    """Deliver queued alerts to every notifier; returns the number delivered.
+
+    An alert counts as delivered only when all notifiers accept it; otherwise
+    it is retried after ALERT_RETRY_SECONDS, up to ALERT_MAX_ATTEMPTS times.
+    Delivery is at-least-once: a retry goes to every notifier again.
+    """
+    notifiers = _configured_notifiers()
+    if not notifiers:
+        return 0
+    alerts = claim_pending_alerts(limit, ALERT_CLAIM_SECONDS, ALERT_MAX_ATTEMPTS)
+    if not alerts:
+        return 0
+
+    payloads = [
+        {key: alert[key] for key in ("id", "user_id", "product_id", "product_name", "product_url",
+                                     "price_threshold", "previous_price", "price", "created_at")}
+        for alert in alerts
+    ]
+    failed = None
+    for name, notifier in notifiers:
+        try:
+            notifier.send(payloads)
+        except Exception as e:
+            print(f"Error sending alerts via {name}: {e}")
+            failed = f"{name}: {e}"
+
+    if failed:
+        for alert in alerts:
+            mark_alert_failed(alert["id"], failed, ALERT_RETRY_SECONDS)
+        return 0
+    mark_alerts_delivered([alert["id"] for alert in alerts])
+    return len(alerts)
@@ -1,57 +1,93 @@
-import pandas as pd
 import os
-import sqlite3
-from flask import Flask, request, jsonify, send_file
+import json
+import time
+import atexit
+import logging
+from flask import Flask, Response, request, jsonify, stream_with_context, g
 from flask_cors import CORS
-from scraper import scrape_ecom, scrape_product, get_domain
+from scraper import scrape_ecom, scrape_product, scrape_products, get_domain, pages_for_results, cleanup, prelaunch_drivers, driver_pool_stats, product_flight, MAX_SEARCH_PAGES, SELECTORS
+from scheduler import refresh_scheduler, REFRESH_POLL_SECONDS
 from user import login_user, register_user, verify_token, init_db as init_user_db
-from db import insert_product, get_user_tracked_products, delete_tracked_product, create_tables as init_products_db
+from result_store import result_store, search_key
+from scrape_jobs import scrape_jobs
+from singleflight import SingleFlight
+from router import strategy_router
+from cache import normalize_url, page_cache
+from ratelimit import rate_limiter
+from extractors import extractor_stats
+from job_queue import job_queue, QUEUE_ENABLED
+import metrics
+from profiling import install_profiler
+from exporter import export_stream, SEARCH_COLUMNS, TRACKED_COLUMNS, HISTORY_COLUMNS
+from db import insert_product, insert_products, get_user_tracked_products, delete_tracked_product, get_tracked_product, get_price_history, iter_user_tracked_products, iter_price_history, get_user_alerts, create_tables as init_products_db
 from functools import wraps
 
+logger = logging.getLogger(__name__)
+
+# Largest watchlist accepted by one /track/bulk request
+BULK_TRACK_MAX = int(os.getenv("BULK_TRACK_MAX", "500"))
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+REQUEST_SECONDS = metrics.histogram(
+    "http_request_seconds", "Flask request latency by route", ("route", "method", "status")
+)
+
 app = Flask(__name__)
 CORS(app)
+# Opt-in cProfile dumps of selected requests (PROFILE_ENABLED=1)
+install_profiler(app)
+
+# Quit pooled browsers when the server process exits
+atexit.register(cleanup)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # The route pattern, not the path, so ids don't create new series
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route,
+                                method=request.method, status=response.status_code)
+    return response
 
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization')
-        print(f"Authorization header: {token}")
         
         if not token:
-            print("No token provided")
+            logger.debug("auth rejected reason=missing_token path=%s", request.path)
             return jsonify({"error": "Token is missing"}), 401
             
         try:
             # Check if token has 'Bearer ' prefix
             if ' ' in token:
                 prefix, token = token.split(' ', 1)
-                print(f"Token prefix: {prefix}, Token: {token}")
                 if prefix.lower() != 'bearer':
-                    print(f"Invalid token prefix: {prefix}")
+                    logger.debug("auth rejected reason=bad_prefix path=%s", request.path)
                     return jsonify({"error": "Invalid token format"}), 401
             
-            print(f"Processing token: {token[:10]}...")
             success, payload = verify_token(token)
             
             if not success:
-                print(f"Token verification failed: {payload}")
+                logger.debug("auth rejected reason=%s path=%s", payload, request.path)
                 return jsonify({"error": payload}), 401
                 
-            print(f"Token verified successfully for user_id: {payload.get('user_id')}")
             # Pass user_id to the wrapped function
             kwargs['user_id'] = payload['user_id']
             return f(*args, **kwargs)
         except Exception as e:
-            print(f"Token exception: {str(e)}")
+            logger.warning("auth error=%s path=%s", e, request.path)
             return jsonify({"error": f"Invalid token: {str(e)}"}), 401
     return decorated
 
-def get_db_connection():
-    conn = sqlite3.connect("products.db")
-    conn.row_factory = sqlite3.Row
-    return conn
-
 # Authentication routes
 @app.route('/register', methods=['POST'])
 def register():
@@ -84,52 +120,176 @@ def login():
         return jsonify(result), 200
     return jsonify({"error": result}), 401
 
-scraped_data = []
+PLATFORM_URLS = {
+    "amazon": "https://www.amazon.in/",
+    "flipkart": "https://www.flipkart.com/"
+}
+
+def product_dict(item):
+    return {"title": item[0], "price": item[1], "rating": item[2], "url": item[3]}
+
+def positive_int(value):
+    """Parse an optional positive integer (int or digit string); raises ValueError otherwise"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError
+    value = int(value)
+    if value < 1:
+        raise ValueError
+    return value
+
+def search_limits(data):
+    """Parse optional max_pages/max_results; raises ValueError unless they are integers >= 1"""
+    try:
+        max_pages = positive_int(data.get("max_pages"))
+        max_results = positive_int(data.get("max_results"))
+    except ValueError:
+        raise ValueError("max_pages and max_results must be integers of at least 1")
+    if max_results and not max_pages:
+        max_pages = pages_for_results(max_results)
+    if max_pages:
+        max_pages = min(max(max_pages, 1), MAX_SEARCH_PAGES)
+    return max_pages, max_results
+
+search_flight = SingleFlight("search")
+
+def run_search(key, platform, query, max_pages):
+    """Scrape a search and cache its results"""
+    scraped_data = scrape_ecom(PLATFORM_URLS[platform], query, max_pages=max_pages)
+    if scraped_data:
+        result_store.put(key, scraped_data)
+    return scraped_data
+
 @app.route('/scrape', methods=['POST'])
 @token_required
 def scrape(user_id):
-    global scraped_data
-    data = request.json
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON"}), 400
+
     platform = data.get("platform")
     query = data.get("query")
-
-    url_map = {
-        "amazon": "https://www.amazon.in/",
-        "flipkart": "https://www.flipkart.com/"
-    }
-
-    if platform not in url_map:
+    if platform not in PLATFORM_URLS:
         return jsonify({"error": "Invalid platform"}), 400
+    if not query or not isinstance(query, str):
+        return jsonify({"error": "Query is required"}), 400
 
-    scraped_data = scrape_ecom(url_map[platform], query)
+    # Optional multi-page crawl: results are cached per page count and trimmed to max_results
+    try:
+        max_pages, max_results = search_limits(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Serve repeat searches from the result store instead of re-running the browser,
+    # and let identical searches that arrive meanwhile wait for the one in flight
+    key = search_key(platform, query, max_pages or 1)
+    scraped_data = result_store.get(key)
+    if scraped_data is None:
+        scraped_data = search_flight.do(key, lambda: run_search(key, platform, query, max_pages))
+    if max_results:
+        scraped_data = scraped_data[:max_results]
+    result_store.set_user_results(user_id, scraped_data)
     
-    response = [{"title": item[0], "price": item[1], "rating": item[2], "url": item[3]} for item in scraped_data]
+    response = [product_dict(item) for item in scraped_data]
     return jsonify(response)
 
-@app.route("/download", methods=["GET"])
+@app.route('/scrape_jobs', methods=['POST'])
 @token_required
-def download():
-    global scraped_data
+def create_scrape_job(user_id):
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON"}), 400
+
+    platform = data.get("platform")
+    query = data.get("query")
+    if platform not in PLATFORM_URLS:
+        return jsonify({"error": "Invalid platform"}), 400
+    if not query or not isinstance(query, str):
+        return jsonify({"error": "Query is required"}), 400
+    try:
+        max_pages, max_results = search_limits(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    job = scrape_jobs.submit(user_id, PLATFORM_URLS[platform], platform, query, max_pages, max_results)
+    return jsonify({"job_id": job.id, "stream_url": f"/scrape_jobs/{job.id}/stream"}), 202
+
+def get_user_scrape_job(job_id, user_id):
+    job = scrape_jobs.get(job_id)
+    if job is None or job.user_id != user_id:
+        return None
+    return job
+
+@app.route('/scrape_jobs/<job_id>', methods=['GET'])
+@token_required
+def scrape_job_status(job_id, user_id):
+    job = get_user_scrape_job(job_id, user_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/scrape_jobs/<job_id>/stream', methods=['GET'])
+@token_required
+def stream_scrape_job(job_id, user_id):
+    """Stream a job's products as they are extracted: NDJSON by default, SSE with ?format=sse"""
+    job = get_user_scrape_job(job_id, user_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    use_sse = request.args.get("format") == "sse" or request.accept_mimetypes.best == "text/event-stream"
+
+    def events():
+        for record in job.follow():
+            if record is None:
+                yield ": keepalive\n\n" if use_sse else "\n"
+                continue
+            payload = json.dumps(product_dict(record))
+            yield f"event: product\ndata: {payload}\n\n" if use_sse else f'{{"type": "product", "data": {payload}}}\n'
+
+        summary = json.dumps({"status": job.status, "error": job.error, "count": len(job.records)})
+        yield f"event: end\ndata: {summary}\n\n" if use_sse else f'{{"type": "end", "data": {summary}}}\n'
+
+    mimetype = "text/event-stream" if use_sse else "application/x-ndjson"
+    return Response(stream_with_context(events()), mimetype=mimetype, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def export_response(rows, columns, filename):
+    """Stream rows to the client in the requested ?format= without a temp file"""
     file_format = request.args.get("format", "csv").lower()
+    try:
+        chunks, mime_type, extension = export_stream(rows, columns, file_format)
+    except ValueError:
+        return jsonify({"error": "Invalid format"}), 400
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mime_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'}
+    )
 
+@app.route("/download", methods=["GET"])
+@token_required
+def download(user_id):
+    scraped_data = result_store.get_user_results(user_id)
     if not scraped_data:
         return jsonify({"error": "No data available"}), 400
 
-    df = pd.DataFrame(scraped_data)
-    filename = f"scraped_data.{file_format}"
-    filepath = os.path.join(os.getcwd(), filename)
-
-    # Save the file in the correct format
-    if file_format == "csv":
-        df.to_csv(filepath, index=False, header=["Title", "Price", "Rating", "Url"])
-        mime_type = "text/csv"
-    elif file_format == "json":
-        df.to_json(filepath, orient="records", lines=True)
-        mime_type = "application/json"
-    else:
-        return jsonify({"error": "Invalid format"}), 400
+    return export_response(scraped_data, SEARCH_COLUMNS, "scraped_data")
+
+@app.route("/export/tracked_products", methods=["GET"])
+@token_required
+def export_tracked_products(user_id):
+    return export_response(iter_user_tracked_products(user_id), TRACKED_COLUMNS, "tracked_products")
 
-    return send_file(filepath, mimetype=mime_type, as_attachment=True)
+@app.route("/export/price_history/<int:product_id>", methods=["GET"])
+@token_required
+def export_price_history(product_id, user_id):
+    if get_tracked_product(user_id, product_id) is None:
+        return jsonify({"error": "Product not found"}), 404
+
+    end = request.args.get("end", type=int) or int(time.time())
+    start = request.args.get("start", type=int) or 0
+    return export_response(iter_price_history(product_id, start, end), HISTORY_COLUMNS, f"price_history_{product_id}")
 
 @app.route("/track", methods=["POST"])
 @token_required
@@ -158,6 +318,72 @@ def track_product(user_id):
 
     return jsonify({"message": "Product added for tracking!", "current_price": current_price})
 
+@app.route("/track/bulk", methods=["POST"])
+@token_required
+def track_products_bulk(user_id):
+    """Track many products at once.
+
+    Body: {"products": [{"product_url": ..., "price_threshold": ...}, ...],
+    "async": false}. URLs are de-duplicated and scraped concurrently, and
+    every product that scraped is inserted in one transaction. With "async"
+    the products are inserted straight away without a price and filled in by
+    a background refresh (poll /update_prices/<job_id>).
+    """
+    data = request.get_json()
+    if not data or not isinstance(data.get("products"), list):
+        return jsonify({"error": "Invalid JSON"}), 400
+    if len(data["products"]) > BULK_TRACK_MAX:
+        return jsonify({"error": f"At most {BULK_TRACK_MAX} products per request"}), 400
+
+    # Per-URL status entries in request order; accepted URLs get theirs below
+    results = []
+    statuses = {}
+    thresholds = {}
+    seen = set()
+    for item in data["products"]:
+        item = {"product_url": item} if isinstance(item, str) else item
+        product_url = item.get("product_url") if isinstance(item, dict) else None
+        # Anything but a string (a number, a list...) marks only this entry invalid
+        product_url = product_url.strip() if isinstance(product_url, str) else ""
+        entry = {"product_url": product_url or str(item), "status": "invalid"}
+        results.append(entry)
+        if not product_url or get_domain(product_url) not in SELECTORS:
+            continue
+        key = normalize_url(product_url)
+        if key in seen:
+            entry["status"] = "duplicate"
+            continue
+        seen.add(key)
+        statuses[product_url] = entry
+        thresholds[product_url] = item.get("price_threshold")
+
+    urls = list(thresholds)
+    job_id = None
+    if data.get("async"):
+        rows = [(url, url, get_domain(url), None, thresholds[url]) for url in urls]
+        inserted = insert_products(user_id, rows)
+        queued = [url for url in urls if inserted.get(url)]
+        job_id = refresh_scheduler.submit(queued, user_id) if queued else None
+        for url in urls:
+            statuses[url]["status"] = "queued" if inserted.get(url) else "already_tracked"
+    else:
+        scraped = scrape_products(urls)
+        rows = []
+        for url in urls:
+            if scraped.get(url):
+                name, price = scraped[url][0][:2]
+                rows.append((name, url, get_domain(url), price, thresholds[url]))
+            else:
+                statuses[url]["status"] = "failed"
+        inserted = insert_products(user_id, rows)
+        for url, added in inserted.items():
+            statuses[url]["status"] = "added" if added else "already_tracked"
+
+    response = {"results": results}
+    if job_id:
+        response["job_id"] = job_id
+    return jsonify(response), 202 if job_id else 200
+
 @app.route("/tracked_products", methods=["GET"])
 @token_required
 def get_tracked_products(user_id):
@@ -168,28 +394,44 @@ def get_tracked_products(user_id):
 @app.route("/update_prices", methods=["POST"])
 @token_required
 def update_prices(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT product_url FROM tracked_products WHERE user_id = ?", (user_id,))
-    products = cursor.fetchall()
-
-    for product in products:
-        url = product["product_url"]
-        scraped_data = scrape_product(url)
-        if scraped_data:
-            new_price = scraped_data[0][1] if scraped_data else None
-            cursor.execute('''
-                UPDATE tracked_products
-                SET previous_price = current_price, 
-                    current_price = ?, 
-                    last_updated = CURRENT_TIMESTAMP
-                WHERE product_url = ? AND user_id = ?
-            ''', (new_price, url, user_id))
-
-    conn.commit()
-    conn.close()
-
-    return jsonify({"message": "Prices updated successfully!"})
+    products = get_user_tracked_products(user_id)
+    urls = [product["product_url"] for product in products]
+
+    # Refresh runs on the scheduler's worker pool; poll /update_prices/<job_id> for progress
+    job_id = refresh_scheduler.submit(urls, user_id)
+    return jsonify({"message": "Price update started", "job_id": job_id}), 202
+
+@app.route("/update_prices/<job_id>", methods=["GET"])
+@token_required
+def update_prices_status(job_id, user_id):
+    job = refresh_scheduler.get_job(job_id)
+    if job is None or job.user_id != user_id:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/price_history/<int:product_id>", methods=["GET"])
+@token_required
+def price_history(product_id, user_id):
+    if get_tracked_product(user_id, product_id) is None:
+        return jsonify({"error": "Product not found"}), 404
+
+    # Range in epoch seconds (default: last 30 days), downsampled to at most `buckets` points
+    end = request.args.get("end", type=int) or int(time.time())
+    start = request.args.get("start", type=int) or end - 30 * 24 * 3600
+    buckets = min(max(request.args.get("buckets", 200, type=int), 1), 2000)
+    if start >= end:
+        return jsonify({"error": "start must be before end"}), 400
+
+    bucket_seconds = max(1, -(-(end - start) // buckets))
+    points = get_price_history(product_id, start, end, bucket_seconds)
+    return jsonify({"product_id": product_id, "bucket_seconds": bucket_seconds, "points": points})
+
+@app.route("/alerts", methods=["GET"])
+@token_required
+def list_alerts(user_id):
+    """The user's most recent price-threshold alerts"""
+    limit = min(request.args.get("limit", 100, type=int), 1000)
+    return jsonify(get_user_alerts(user_id, limit))
 
 @app.route("/remove_tracked_product/<int:product_id>", methods=["DELETE"])
 @token_required
@@ -200,17 +442,81 @@ def remove_tracked_product(product_id, user_id):
             
     return jsonify({"message": "Product removed successfully"}), 200
 
+@app.route("/routing_stats", methods=["GET"])
+@token_required
+def routing_stats(user_id):
+    """Fetch-strategy success rates and the routing decisions made from them"""
+    return jsonify(strategy_router.stats())
+
+def collect_component_stats():
+    """Counters the cache, rate limiter, router and queues already keep, as gauges"""
+    gauges = [
+        ("scraper_cache_events", "Product cache events in this process", ("event",),
+         [((event,), count) for event, count in page_cache.stats().items()]),
+        ("singleflight_calls", "Single-flight calls by outcome", ("flight", "event"),
+         [((name, event), count) for name, flight in (("product", product_flight), ("search", search_flight))
+          for event, count in flight.stats().items()]),
+        ("result_store", "In-memory search result store size", ("field",),
+         [((field,), value) for field, value in result_store.stats().items()]),
+    ]
+
+    hosts = rate_limiter.stats()
+    for field, help in (("rate", "Current allowed requests per second"),
+                        ("requests", "Requests sent"), ("throttled", "Throttled responses seen")):
+        gauges.append((f"rate_limiter_{field}", help, ("host",),
+                       [((host,), values[field]) for host, values in hosts.items()]))
+
+    extractors = extractor_stats()
+    gauges.append(("extractor_pages", "Product pages run through the extractor chain", (),
+                   [((), extractors.pop("pages"))]))
+    gauges.append(("extractor_misses", "Product pages no extractor could handle", (),
+                   [((), extractors.pop("misses"))]))
+    gauges.append(("extractor_events", "Extractor attempts, hits and errors", ("extractor", "event"),
+                   [((name, event), count) for name, counts in extractors.items() for event, count in counts.items()]))
+
+    strategies = strategy_router.stats()["strategies"]
+    for field, help in (("success_rate", "Moving-average success rate of a fetch strategy"),
+                        ("latency", "Moving-average latency of a fetch strategy in seconds"),
+                        ("samples", "Outcomes recorded for a fetch strategy")):
+        gauges.append((f"router_strategy_{field}", help, ("domain", "pattern", "strategy"),
+                       [((row["domain"], row["pattern"], row["strategy"]), row[field]) for row in strategies]))
+
+    pool = driver_pool_stats()
+    if pool:
+        gauges.append(("driver_pool", "WebDriver pool occupancy", ("field",),
+                       [((field,), value) for field, value in pool.items()]))
+    if QUEUE_ENABLED:
+        gauges.append(("job_queue_jobs", "Queued jobs by status", ("status",),
+                       [((status,), count) for status, count in job_queue.stats().items()]))
+    return gauges
+
+metrics.register_collector("components", collect_component_stats)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics; the component stats are only gathered here, per scrape"""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return jsonify({"error": "Invalid metrics token"}), 401
+    return Response(metrics.render(), mimetype=metrics.CONTENT_TYPE)
+
 @app.route("/check-auth", methods=["GET"])
 @token_required
 def check_auth(user_id):
     """Debug endpoint to check if token authentication is working."""
-    print(f"Auth check successful for user_id: {user_id}")
+    logger.debug("auth check user_id=%s", user_id)
     return jsonify({
         "message": "Authentication successful",
         "user_id": user_id
     })
 
 if __name__ == '__main__':
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
     init_user_db()
     init_products_db()
+    # With the debug reloader only the serving child process runs the scheduler
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        if REFRESH_POLL_SECONDS > 0:
+            refresh_scheduler.start()
+        # Start browsers (BROWSER_PRELAUNCH of them) while the server comes up
+        prelaunch_drivers()
     app.run(debug=True)
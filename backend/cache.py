@@ -0,0 +1,199 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+from connections import get_connection
+
+CACHE_DATABASE = os.getenv("CACHE_DATABASE", "cache.db")
+DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", "3600"))
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# Expired entries are kept this long for conditional revalidation, then dropped
+STALE_GRACE = int(os.getenv("CACHE_STALE_GRACE", str(7 * 24 * 3600)))
+# Eviction runs after this many writes from a process instead of on every write
+EVICT_EVERY = 100
+
+# Query parameters that only carry tracking/session data and never change the product
+TRACKING_PARAMS = {"ref", "ref_", "tag", "qid", "sr", "keywords", "crid", "sprefix", "psc", "th",
+                   "smid", "spLa", "otracker", "fm", "iid", "ppt", "ppn", "ssid", "lid", "marketplace",
+                   "srno", "store"}
+TRACKING_PREFIXES = ("utm_", "pf_rd_", "pd_rd_", "_encoding", "content-id")
+AMAZON_ASIN = re.compile(r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})", re.IGNORECASE)
+
+
+def _parse_ttls(spec):
+    ttls = {}
+    for item in spec.split(","):
+        if "=" in item:
+            domain, ttl = item.split("=", 1)
+            ttls[domain.strip()] = int(ttl)
+    return ttls
+
+# Per-domain TTLs in seconds, e.g. CACHE_DOMAIN_TTLS="amazon=1800,flipkart=3600"
+DOMAIN_TTLS = _parse_ttls(os.getenv("CACHE_DOMAIN_TTLS", "amazon=3600,flipkart=3600"))
+
+
+class CacheEntry(namedtuple("CacheEntry", ["key", "value", "etag", "last_modified", "expires_at"])):
+    __slots__ = ()
+
+    @property
+    def fresh(self):
+        return self.expires_at > time.time()
+
+
+def normalize_url(url):
+    """Normalize a product URL so tracking variants share one cache key"""
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+    if host.startswith("m."):
+        host = "www." + host[2:]
+
+    if "amazon" in host:
+        match = AMAZON_ASIN.search(parsed.path)
+        if match:
+            return f"https://{host}/dp/{match.group(1).upper()}"
+
+    query = [
+        (name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=False)
+        if name not in TRACKING_PARAMS and not name.startswith(TRACKING_PREFIXES)
+    ]
+    path = parsed.path.rstrip("/") or "/"
+    return urlunparse(("https", host, path, "", urlencode(sorted(query)), ""))
+
+
+def get_ttl(domain):
+    return DOMAIN_TTLS.get(domain, DEFAULT_TTL)
+
+
+class PageCache:
+    """Product cache in a local SQLite file shared by every worker process.
+
+    Entries are keyed by normalized product URL and expire after a per-domain
+    TTL. Expired entries keep their ETag/Last-Modified validators so a refresh
+    can be a conditional request. The table is bounded to max_entries rows by
+    evicting the least recently used ones.
+    """
+
+    def __init__(self, path=CACHE_DATABASE, max_entries=MAX_ENTRIES):
+        self._path = path
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "stale": 0, "revalidated": 0, "evictions": 0, "writes": 0}
+        self._writes_since_evict = 0
+        self._initialized = False
+
+    def _connect(self):
+        conn = get_connection(self._path)
+        if not self._initialized:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    domain TEXT,
+                    value TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_access ON cache_entries(last_access)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self):
+        """Return hit/miss/eviction counters for this process"""
+        with self._lock:
+            return dict(self._counters)
+
+    def get(self, key, count=True):
+        """Return the CacheEntry for key (fresh or stale), or None.
+
+        With count=False the lookup is left out of the hit/miss counters, for
+        repeat lookups of a request that was already counted.
+        """
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, etag, last_modified, expires_at, last_access FROM cache_entries WHERE key = ?",
+            (key,)
+        ).fetchone()
+        if row is None:
+            if count:
+                self._count("misses")
+            return None
+
+        now = time.time()
+        # Only record access time once a minute per entry to keep reads mostly read-only
+        if now - row[4] > 60:
+            with conn:
+                conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (now, key))
+
+        entry = CacheEntry(key, json.loads(row[0]), row[1], row[2], row[3])
+        if count:
+            self._count("hits" if entry.fresh else "stale")
+        return entry
+
+    def set(self, key, value, domain=None, etag=None, last_modified=None):
+        """Store value for key with the domain's TTL and optional validators"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO cache_entries
+                    (key, domain, value, etag, last_modified, stored_at, expires_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (key, domain, json.dumps(value), etag, last_modified, now, now + get_ttl(domain), now))
+
+        self._count("writes")
+        with self._lock:
+            self._writes_since_evict += 1
+            due = self._writes_since_evict >= EVICT_EVERY
+            if due:
+                self._writes_since_evict = 0
+        if due:
+            self.evict()
+
+    def touch(self, key, domain=None):
+        """Extend a stale entry's lifetime after a 304 Not Modified"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE cache_entries SET expires_at = ?, last_access = ? WHERE key = ?",
+                (now + get_ttl(domain), now, key)
+            )
+        self._count("revalidated")
+
+    def evict(self):
+        """Drop long-expired entries, then the least recently used beyond max_entries"""
+        with self._connect() as conn:
+            cursor = conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (time.time() - STALE_GRACE,))
+            removed = cursor.rowcount
+            cursor = conn.execute('''
+                DELETE FROM cache_entries WHERE key IN (
+                    SELECT key FROM cache_entries ORDER BY last_access
+                    LIMIT max(0, (SELECT COUNT(*) FROM cache_entries) - ?)
+                )
+            ''', (self._max_entries,))
+            removed += cursor.rowcount
+        self._count("evictions", removed)
+        return removed
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Request headers that revalidate a stale entry instead of refetching it"""
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+
+page_cache = PageCache()
@@ -0,0 +1,69 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# How long a writer waits on a locked database before raising "database is locked"
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Page cache per connection, in KiB
+CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "8192"))
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+
+_local = threading.local()
+
+
+def _open(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers proceed while a writer commits; NORMAL sync is safe under WAL
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_connection(path):
+    """Return this thread's reusable connection to the database at path.
+
+    Connections are opened once per thread and database, with WAL journaling
+    and tuned pragmas, and must not be closed by callers. A forked child
+    process opens its own connections instead of sharing the parent's.
+    """
+    pid = os.getpid()
+    if getattr(_local, "pid", None) != pid:
+        _local.pid = pid
+        _local.connections = {}
+
+    conn = _local.connections.get(path)
+    if conn is None:
+        conn = _open(path)
+        _local.connections[path] = conn
+    return conn
+
+
+@contextmanager
+def transaction(path):
+    """Run the with-block in one transaction: commit on success, roll back on error"""
+    conn = get_connection(path)
+    with conn:
+        yield conn
+
+
+def execute_batch(path, sql, rows):
+    """Execute sql for every row with executemany in a single transaction"""
+    rows = list(rows)
+    if not rows:
+        return 0
+    with transaction(path) as conn:
+        conn.executemany(sql, rows)
+    return len(rows)
+
+
+def close_connections():
+    """Close the calling thread's connections"""
+    for conn in getattr(_local, "connections", {}).values():
+        conn.close()
+    _local.connections = {}
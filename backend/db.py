@@ -1,12 +1,24 @@
+import re
 import sqlite3
+import time
+from connections import get_connection, transaction, execute_batch
+from metrics import histogram
 
 DATABASE = "products.db"
 
+# Leading star rating; rejects review counts like "1,234 ratings"
+RATING_PATTERN = re.compile(r"^\s*([0-5](?:\.\d+)?)(?![\d,])")
+ROLLUP_BUCKET_SECONDS = 24 * 3600
+
+DB_QUERY_SECONDS = histogram("db_query_seconds", "Latency of products database calls", ("query",))
+
+def timed_query(fn):
+    """Record each call's latency in DB_QUERY_SECONDS under the function's name"""
+    return DB_QUERY_SECONDS.timed(query=fn.__name__)(fn)
+
 def get_db_connection():
-    """Get a connection to the database with row factory set to sqlite3.Row"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get this thread's pooled connection to the database (rows are sqlite3.Row)"""
+    return get_connection(DATABASE)
 
 def create_tables():
     """Creates necessary tables in the database if they do not exist."""
@@ -20,19 +32,138 @@ def create_tables():
             product_name TEXT NOT NULL,
             product_url TEXT NOT NULL,
             platform TEXT NOT NULL,
-            current_price REAL NOT NULL,
+            current_price REAL,
             previous_price REAL,
             price_threshold REAL,
             last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            refresh_failures INTEGER NOT NULL DEFAULT 0,
+            next_attempt TIMESTAMP,
             FOREIGN KEY (user_id) REFERENCES users(id),
             UNIQUE(user_id, product_url)
         )
     ''')
 
+    migrate_nullable_current_price(conn)
+    migrate_refresh_backoff(conn)
+
+    # Refreshes update every row for a URL and pick due rows by last_updated
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracked_products_url ON tracked_products(product_url)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tracked_products_last_updated ON tracked_products(last_updated)")
+
+    # Append-only raw price points; the index covers range scans by product
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+            product_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            price REAL NOT NULL,
+            rating REAL,
+            source TEXT,
+            FOREIGN KEY (product_id) REFERENCES tracked_products(id)
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_price_history_product_ts ON price_history(product_id, ts, price)")
+
+    # Daily aggregates that raw points are compacted into once they age out
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_history_rollup (
+            product_id INTEGER NOT NULL,
+            bucket_ts INTEGER NOT NULL,
+            min_price REAL NOT NULL,
+            max_price REAL NOT NULL,
+            sum_price REAL NOT NULL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (product_id, bucket_ts)
+        ) WITHOUT ROWID
+    ''')
+
+    # Threshold checks only ever touch rows that have a threshold
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tracked_products_threshold
+        ON tracked_products(product_url, price_threshold) WHERE price_threshold IS NOT NULL
+    ''')
+
+    # Alerts waiting to be handed to the notifiers; see alerts.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alert_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dedupe_key TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            product_name TEXT,
+            product_url TEXT NOT NULL,
+            price_threshold REAL NOT NULL,
+            previous_price REAL,
+            price REAL NOT NULL,
+            created_at INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_until INTEGER,
+            delivered_at INTEGER,
+            last_error TEXT
+        )
+    ''')
+    # At most one undelivered alert per product and threshold
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_alert_outbox_pending_key
+        ON alert_outbox(dedupe_key) WHERE delivered_at IS NULL
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alert_outbox_pending ON alert_outbox(id) WHERE delivered_at IS NULL")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alert_outbox_user ON alert_outbox(user_id, id)")
+
     conn.commit()
-    conn.close()
     print("✅ Database and tables initialized successfully.")
 
+def migrate_nullable_current_price(conn):
+    """Rebuild tracked_products from older databases where current_price was NOT NULL.
+
+    Bulk tracking inserts products before their first scrape, with no price yet.
+    SQLite can't drop a NOT NULL constraint in place, so the table is copied.
+    """
+    columns = {row["name"]: row for row in conn.execute("PRAGMA table_info(tracked_products)")}
+    if not columns["current_price"]["notnull"]:
+        return
+
+    with conn:
+        conn.execute('''
+            CREATE TABLE tracked_products_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                product_name TEXT NOT NULL,
+                product_url TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                current_price REAL,
+                previous_price REAL,
+                price_threshold REAL,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                UNIQUE(user_id, product_url)
+            )
+        ''')
+        conn.execute('''
+            INSERT INTO tracked_products_new
+            SELECT id, user_id, product_name, product_url, platform, current_price,
+                   previous_price, price_threshold, last_updated
+            FROM tracked_products
+        ''')
+        conn.execute("DROP TABLE tracked_products")
+        conn.execute("ALTER TABLE tracked_products_new RENAME TO tracked_products")
+    print("✅ Migrated tracked_products to allow products without a price yet.")
+
+def migrate_refresh_backoff(conn):
+    """Add the columns that track failed refreshes to older databases"""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(tracked_products)")}
+    with conn:
+        if "refresh_failures" not in columns:
+            conn.execute("ALTER TABLE tracked_products ADD COLUMN refresh_failures INTEGER NOT NULL DEFAULT 0")
+        if "next_attempt" not in columns:
+            conn.execute("ALTER TABLE tracked_products ADD COLUMN next_attempt TIMESTAMP")
+
+def clean_rating(rating_str):
+    """Convert a rating string such as '4.3 out of 5 stars' to a float, or None."""
+    if not isinstance(rating_str, str):
+        return rating_str
+    match = RATING_PATTERN.match(rating_str)
+    return float(match.group(1)) if match else None
+
 def clean_price(price_str):
     """Convert a price string to a float (removes commas and currency symbols)."""
     try:
@@ -40,27 +171,58 @@ def clean_price(price_str):
     except ValueError:
         return None  # Handle invalid prices gracefully
 
+@timed_query
 def insert_product(user_id, product_name, product_url, platform, current_price, price_threshold=None):
     """Inserts a product into the tracked_products table."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     if isinstance(current_price, str):
         current_price = clean_price(current_price)
 
     try:
-        cursor.execute('''
-            INSERT INTO tracked_products (user_id, product_name, product_url, platform, current_price, price_threshold)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, product_name, product_url, platform, current_price, price_threshold))
-        conn.commit()
+        with transaction(DATABASE) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO tracked_products (user_id, product_name, product_url, platform, current_price, price_threshold)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user_id, product_name, product_url, platform, current_price, price_threshold))
+            if current_price is not None:
+                cursor.execute('''
+                    INSERT INTO price_history (product_id, ts, price, rating, source)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (cursor.lastrowid, int(time.time()), current_price, None, "track"))
         return True
     except sqlite3.IntegrityError:
         print(f"⚠️ Product already exists for this user: {product_name}")
         return False
-    finally:
-        conn.close()
 
+@timed_query
+def insert_products(user_id, products):
+    """Inserts many tracked products for a user in one transaction.
+
+    products is a list of (product_name, product_url, platform, current_price,
+    price_threshold) tuples; current_price may be None for a product whose
+    first scrape is still pending. Returns {product_url: inserted?}, False
+    meaning the user already tracks that URL.
+    """
+    ts = int(time.time())
+    inserted = {}
+    with transaction(DATABASE) as conn:
+        for product_name, product_url, platform, current_price, price_threshold in products:
+            if isinstance(current_price, str):
+                current_price = clean_price(current_price)
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO tracked_products
+                    (user_id, product_name, product_url, platform, current_price, price_threshold)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (user_id, product_name, product_url, platform, current_price, price_threshold))
+            inserted[product_url] = cursor.rowcount == 1
+            if inserted[product_url] and current_price is not None:
+                conn.execute('''
+                    INSERT INTO price_history (product_id, ts, price, rating, source)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (cursor.lastrowid, ts, current_price, None, "track"))
+    return inserted
+
+@timed_query
 def get_user_tracked_products(user_id):
     """Retrieves all tracked products for a specific user from the database."""
     conn = get_db_connection()
@@ -69,20 +231,295 @@ def get_user_tracked_products(user_id):
     cursor.execute("SELECT * FROM tracked_products WHERE user_id = ?", (user_id,))
     products = cursor.fetchall()
     
-    conn.close()
     return products
 
+def iter_user_tracked_products(user_id):
+    """Yields a user's tracked products one row at a time (for streaming exports)."""
+    conn = get_db_connection()
+    cursor = conn.execute('''
+        SELECT id, product_name, product_url, platform, current_price, previous_price,
+               price_threshold, last_updated
+        FROM tracked_products WHERE user_id = ? ORDER BY id
+    ''', (user_id,))
+    for row in cursor:
+        yield tuple(row)
+
+@timed_query
+def get_tracked_product(user_id, product_id):
+    """Retrieves one tracked product if it belongs to the user."""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT * FROM tracked_products WHERE id = ? AND user_id = ?", (product_id, user_id))
+    product = cursor.fetchone()
+    
+    return product
+
+@timed_query
 def delete_tracked_product(user_id, product_id):
     """Deletes a tracked product for a specific user."""
+    with transaction(DATABASE) as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM tracked_products WHERE id = ? AND user_id = ?", (product_id, user_id))
+        deleted = cursor.rowcount > 0
+        if deleted:
+            cursor.execute("DELETE FROM price_history WHERE product_id = ?", (product_id,))
+            cursor.execute("DELETE FROM price_history_rollup WHERE product_id = ?", (product_id,))
+            cursor.execute("DELETE FROM alert_outbox WHERE product_id = ? AND delivered_at IS NULL", (product_id,))
+    return deleted
+
+@timed_query
+def get_due_products(interval, hot_interval, threshold_margin, limit):
+    """Returns distinct product URLs that are due for a price refresh.
+
+    Products are due once their last update is older than interval seconds,
+    or hot_interval seconds when their price is within threshold_margin of
+    the user's price_threshold, or have no price yet. Hot products come first.
+    Products whose last refresh failed are skipped until their next_attempt.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
-    
+
+    cursor.execute('''
+        SELECT product_url,
+               MAX(current_price IS NULL
+                   OR (price_threshold IS NOT NULL AND current_price <= price_threshold * ?)) AS hot,
+               MIN(last_updated) AS oldest
+        FROM tracked_products
+        WHERE last_updated <= datetime('now', ?)
+          AND (next_attempt IS NULL OR next_attempt <= datetime('now'))
+        GROUP BY product_url
+        HAVING oldest <= datetime('now', ?) OR hot
+        ORDER BY hot DESC, oldest
+        LIMIT ?
+    ''', (1 + threshold_margin, f"-{int(hot_interval)} seconds", f"-{int(interval)} seconds", limit))
+    urls = [row["product_url"] for row in cursor.fetchall()]
+
+    return urls
+
+@timed_query
+def update_product_prices(updates, failed=(), retry_base=900, retry_max=6 * 3600):
+    """Applies price updates for every user tracking each URL in one transaction.
+
+    updates is a list of (product_url, price, rating, source, title) tuples;
+    title replaces the placeholder name of products still awaiting their
+    first price. Each applied update also appends a point to price_history
+    for every tracked row with that URL, and thresholds crossed by the new
+    prices are queued in alert_outbox within the same transaction.
+
+    URLs in failed (and updates without a usable price) count as failed
+    refreshes: get_due_products skips them for retry_base seconds, doubling
+    per consecutive failure up to retry_max. A successful update resets that.
+    """
+    rows = []
+    history = []
+    failed = list(failed)
+    ts = int(time.time())
+    for url, price, rating, source, title in updates:
+        if isinstance(price, str):
+            price = clean_price(price)
+        if price is not None:
+            rows.append((title or None, price, url))
+            history.append((ts, price, clean_rating(rating), source, url))
+        else:
+            failed.append(url)
+    if not rows and not failed:
+        return 0
+
+    with transaction(DATABASE) as conn:
+        queue_threshold_alerts(conn, rows, ts)
+        conn.executemany('''
+            UPDATE tracked_products
+            SET product_name = CASE WHEN current_price IS NULL THEN coalesce(?1, product_name) ELSE product_name END,
+                previous_price = current_price,
+                current_price = ?2,
+                last_updated = CURRENT_TIMESTAMP,
+                refresh_failures = 0,
+                next_attempt = NULL
+            WHERE product_url = ?3
+        ''', rows)
+        conn.executemany('''
+            INSERT INTO price_history (product_id, ts, price, rating, source)
+            SELECT id, ?, ?, ?, ? FROM tracked_products WHERE product_url = ?
+        ''', history)
+        conn.executemany('''
+            UPDATE tracked_products
+            SET refresh_failures = refresh_failures + 1,
+                next_attempt = datetime('now', '+' || min(?2, ?1 << min(refresh_failures, 20)) || ' seconds')
+            WHERE product_url = ?3
+        ''', [(int(retry_base), int(retry_max), url) for url in dict.fromkeys(failed)])
+    return len(rows)
+
+def queue_threshold_alerts(conn, rows, ts):
+    """Queue an alert for every tracked row whose price drops to or below its threshold.
+
+    rows are the (title, price, product_url) updates about to be applied.
+    They are loaded into a temp table and joined against tracked_products
+    through the partial threshold index in one statement, so the cost
+    follows the batch size rather than the table size. Runs before the
+    prices are updated, while current_price still holds the old price.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS price_updates (product_url TEXT PRIMARY KEY, price REAL NOT NULL)")
+    conn.execute("DELETE FROM temp.price_updates")
+    conn.executemany(
+        "INSERT OR REPLACE INTO temp.price_updates (product_url, price) VALUES (?, ?)",
+        [(url, price) for _, price, url in rows]
+    )
+    cursor = conn.execute('''
+        INSERT OR IGNORE INTO alert_outbox
+            (dedupe_key, user_id, product_id, product_name, product_url, price_threshold,
+             previous_price, price, created_at)
+        SELECT t.id || ':' || t.price_threshold, t.user_id, t.id, t.product_name, t.product_url,
+               t.price_threshold, t.current_price, u.price, ?
+        FROM temp.price_updates u
+        -- CROSS JOIN keeps the small batch as the outer loop, probing the index per URL
+        CROSS JOIN tracked_products t ON t.product_url = u.product_url AND t.price_threshold IS NOT NULL
+        WHERE u.price <= t.price_threshold
+          AND (t.current_price IS NULL OR t.current_price > t.price_threshold)
+    ''', (ts,))
+    return cursor.rowcount
+
+@timed_query
+def claim_pending_alerts(limit, lease_seconds, max_attempts):
+    """Claim up to limit undelivered alerts for delivery by this process.
+
+    Claimed alerts are hidden from other dispatchers for lease_seconds, so
+    an alert is only sent again if its dispatcher dies before marking it.
+    """
+    conn = get_db_connection()
+    now = int(time.time())
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        cursor.execute("DELETE FROM tracked_products WHERE id = ? AND user_id = ?", (product_id, user_id))
+        alerts = conn.execute('''
+            SELECT * FROM alert_outbox
+            WHERE delivered_at IS NULL AND attempts < ? AND (claimed_until IS NULL OR claimed_until < ?)
+            ORDER BY id LIMIT ?
+        ''', (max_attempts, now, limit)).fetchall()
+        conn.executemany(
+            "UPDATE alert_outbox SET claimed_until = ?, attempts = attempts + 1 WHERE id = ?",
+            [(now + lease_seconds, alert["id"]) for alert in alerts]
+        )
         conn.commit()
-        return cursor.rowcount > 0
-    finally:
-        conn.close()
+    except Exception:
+        conn.rollback()
+        raise
+    return [dict(alert) for alert in alerts]
+
+@timed_query
+def mark_alerts_delivered(alert_ids):
+    """Record successful delivery of the given alerts"""
+    now = int(time.time())
+    return execute_batch(
+        DATABASE,
+        "UPDATE alert_outbox SET delivered_at = ?, claimed_until = NULL, last_error = NULL WHERE id = ?",
+        [(now, alert_id) for alert_id in alert_ids]
+    )
+
+@timed_query
+def mark_alert_failed(alert_id, error, retry_seconds):
+    """Record a failed delivery; the alert is retried after retry_seconds"""
+    with transaction(DATABASE) as conn:
+        conn.execute(
+            "UPDATE alert_outbox SET last_error = ?, claimed_until = ? WHERE id = ?",
+            (str(error), int(time.time()) + retry_seconds, alert_id)
+        )
+
+@timed_query
+def get_user_alerts(user_id, limit=100):
+    """Returns a user's most recent alerts, newest first."""
+    conn = get_db_connection()
+    cursor = conn.execute('''
+        SELECT id, product_id, product_name, product_url, price_threshold, previous_price, price,
+               created_at, delivered_at
+        FROM alert_outbox WHERE user_id = ? ORDER BY id DESC LIMIT ?
+    ''', (user_id, limit))
+    return [dict(row) for row in cursor.fetchall()]
+
+@timed_query
+def get_price_history(product_id, start_ts, end_ts, bucket_seconds):
+    """Returns a product's price series between start_ts and end_ts, downsampled server-side.
+
+    Raw points and compacted daily rollups are merged into buckets of
+    bucket_seconds, each with the min, max and average price.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT bucket, MIN(low) AS min_price, MAX(high) AS max_price,
+               SUM(total) / SUM(samples) AS avg_price, SUM(samples) AS samples
+        FROM (
+            SELECT (ts - :start) / :size AS bucket, MIN(price) AS low, MAX(price) AS high,
+                   SUM(price) AS total, COUNT(*) AS samples
+            FROM price_history
+            WHERE product_id = :product_id AND ts BETWEEN :start AND :end
+            GROUP BY bucket
+            UNION ALL
+            SELECT (bucket_ts - :start) / :size AS bucket, MIN(min_price), MAX(max_price),
+                   SUM(sum_price), SUM(samples)
+            FROM price_history_rollup
+            WHERE product_id = :product_id AND bucket_ts BETWEEN :start AND :end
+            GROUP BY bucket
+        )
+        GROUP BY bucket
+        ORDER BY bucket
+    ''', {"product_id": product_id, "start": start_ts, "end": end_ts, "size": bucket_seconds})
+    points = [
+        {
+            "ts": start_ts + row["bucket"] * bucket_seconds,
+            "min": row["min_price"],
+            "max": row["max_price"],
+            "avg": row["avg_price"],
+            "samples": row["samples"],
+        }
+        for row in cursor.fetchall()
+    ]
+
+    return points
+
+def iter_price_history(product_id, start_ts, end_ts):
+    """Yields (ts, price, rating, source) points in time order, one row at a time.
+
+    Periods that were already compacted are returned as one point per day
+    with the daily average price and source 'rollup'.
+    """
+    conn = get_db_connection()
+    cursor = conn.execute('''
+        SELECT ts, price, rating, source FROM price_history
+        WHERE product_id = :product_id AND ts BETWEEN :start AND :end
+        UNION ALL
+        SELECT bucket_ts, sum_price / samples, NULL, 'rollup' FROM price_history_rollup
+        WHERE product_id = :product_id AND bucket_ts BETWEEN :start AND :end
+        ORDER BY 1
+    ''', {"product_id": product_id, "start": start_ts, "end": end_ts})
+    for row in cursor:
+        yield tuple(row)
+
+@timed_query
+def compact_price_history(raw_retention_seconds, rollup_retention_seconds=None):
+    """Rolls raw price points older than the retention window into daily rollups."""
+    now = int(time.time())
+    cutoff = now - raw_retention_seconds
+    with transaction(DATABASE) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO price_history_rollup (product_id, bucket_ts, min_price, max_price, sum_price, samples)
+            SELECT product_id, ts / :size * :size AS bucket_ts, MIN(price), MAX(price), SUM(price), COUNT(*)
+            FROM price_history
+            WHERE ts < :cutoff
+            GROUP BY product_id, bucket_ts
+            ON CONFLICT(product_id, bucket_ts) DO UPDATE SET
+                min_price = MIN(min_price, excluded.min_price),
+                max_price = MAX(max_price, excluded.max_price),
+                sum_price = sum_price + excluded.sum_price,
+                samples = samples + excluded.samples
+        ''', {"size": ROLLUP_BUCKET_SECONDS, "cutoff": cutoff})
+        cursor.execute("DELETE FROM price_history WHERE ts < ?", (cutoff,))
+        compacted = cursor.rowcount
+
+        if rollup_retention_seconds:
+            cursor.execute("DELETE FROM price_history_rollup WHERE bucket_ts < ?", (now - rollup_retention_seconds,))
+    return compacted
 
 if __name__ == "__main__":
     create_tables()  # Run this file to initialize the database
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Pool sizing and recycling policy, overridable from the environment
+POOL_SIZE = int(os.getenv("DRIVER_POOL_SIZE", "2"))
+MAX_USES = int(os.getenv("DRIVER_MAX_USES", "50"))
+LEASE_TIMEOUT = float(os.getenv("DRIVER_LEASE_TIMEOUT", "60"))
+
+
+class _PooledDriver:
+    """A driver owned by the pool together with its usage count"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+        self.created_at = time.time()
+
+
+class DriverPool:
+    """Fixed-size pool of WebDriver instances that callers lease and return.
+
+    Drivers are created lazily (or up front with warm_up) by the given factory,
+    health-checked before every lease, and recycled after max_uses page loads
+    or when they stop responding. When every driver is leased, callers queue
+    until one is returned or the lease timeout expires.
+    """
+
+    def __init__(self, factory, size=POOL_SIZE, max_uses=MAX_USES, lease_timeout=LEASE_TIMEOUT):
+        self._factory = factory
+        self._size = max(1, size)
+        self._max_uses = max_uses
+        self._lease_timeout = lease_timeout
+        # Idle drivers (most recently returned last) and the number created;
+        # waiters are woken whenever a driver is returned or a slot frees up
+        self._idle = []
+        self._cond = threading.Condition()
+        self._created = 0
+        self._closed = False
+
+    @property
+    def size(self):
+        return self._size
+
+    def stats(self):
+        """Return a snapshot of the pool occupancy"""
+        with self._cond:
+            created = self._created
+            idle = len(self._idle)
+        return {"size": self._size, "created": created, "idle": idle, "leased": created - idle}
+
+    def warm_up(self, count=None):
+        """Pre-launch up to count drivers (defaults to the full pool size)"""
+        target = self._size if count is None else min(count, self._size)
+        with self._cond:
+            already_idle = len(self._idle)
+        launched = 0
+        while launched < target - already_idle:
+            if not self._reserve_slot():
+                break
+            entry = self._create()
+            if entry is None:
+                break
+            self._put_idle(entry)
+            launched += 1
+        return launched
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """Lease a driver for the duration of the with-block"""
+        entry = self._acquire(self._lease_timeout if timeout is None else timeout)
+        healthy = True
+        try:
+            yield entry.driver
+        except Exception:
+            # A page-level failure (timeouts, missing elements) leaves the
+            # browser usable; only discard it if it no longer responds.
+            healthy = self._is_alive(entry)
+            raise
+        finally:
+            entry.uses += 1
+            self._release(entry, healthy)
+
+    def close(self):
+        """Quit every idle driver; leased drivers are quit when returned"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for entry in idle:
+            self._discard(entry)
+
+    def _acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed")
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._created < self._size:
+                        # Reserve the slot now; the browser is launched outside the lock
+                        self._created += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No WebDriver available after {timeout:.0f}s")
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                entry = self._create()
+                if entry is None:
+                    raise RuntimeError("Failed to launch a WebDriver instance")
+                return entry
+
+            if self._is_alive(entry):
+                return entry
+            # Crashed while idle: drop it and try again with a fresh slot
+            self._discard(entry)
+
+    def _release(self, entry, healthy):
+        if self._closed or not healthy or entry.uses >= self._max_uses:
+            self._discard(entry)
+        else:
+            self._put_idle(entry)
+
+    def _put_idle(self, entry):
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def _reserve_slot(self):
+        with self._cond:
+            if self._created >= self._size:
+                return False
+            self._created += 1
+            return True
+
+    def _free_slot(self):
+        with self._cond:
+            self._created -= 1
+            # A waiter can now launch a replacement instead of sitting out its timeout
+            self._cond.notify()
+
+    def _create(self):
+        try:
+            return _PooledDriver(self._factory())
+        except Exception as e:
+            print(f"Error launching WebDriver: {e}")
+            self._free_slot()
+            return None
+
+    def _discard(self, entry):
+        try:
+            entry.driver.quit()
+        except Exception as e:
+            print(f"Error quitting WebDriver: {e}")
+        self._free_slot()
+
+    @staticmethod
+    def _is_alive(entry):
+        try:
+            entry.driver.current_url
+            return True
+        except Exception:
+            return False
@@ -0,0 +1,232 @@
+import csv
+import io
+import json
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+# Rows are flushed to the response in batches of this many records
+CSV_BATCH = 500
+PARQUET_BATCH = 10000
+
+# Column specs are (name, kind) pairs; kind is "str", "float" or "int"
+SEARCH_COLUMNS = [("Title", "str"), ("Price", "str"), ("Rating", "str"), ("Url", "str")]
+TRACKED_COLUMNS = [
+    ("id", "int"), ("product_name", "str"), ("product_url", "str"), ("platform", "str"),
+    ("current_price", "float"), ("previous_price", "float"), ("price_threshold", "float"),
+    ("last_updated", "str"),
+]
+HISTORY_COLUMNS = [("ts", "int"), ("price", "float"), ("rating", "float"), ("source", "str")]
+
+MIME_TYPES = {
+    "csv": "text/csv",
+    "json": "application/x-ndjson",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+EXTENSIONS = {"json": "jsonl", "ndjson": "jsonl"}
+
+
+class _ChunkSink:
+    """Write-only file object that buffers bytes until the generator drains them"""
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._buffer.write(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def drain(self):
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _csv_chunks(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for batch in _batches(rows, CSV_BATCH):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _ndjson_chunks(rows, columns):
+    names = [name for name, _ in columns]
+    for batch in _batches(rows, CSV_BATCH):
+        lines = [json.dumps(dict(zip(names, row)), ensure_ascii=False) for row in batch]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _parquet_chunks(rows, columns):
+    # Imported lazily so the other formats don't need pyarrow installed
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"str": pa.string(), "float": pa.float64(), "int": pa.int64()}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        # Each batch becomes one row group, sent as soon as it is encoded
+        for batch in _batches(rows, PARQUET_BATCH):
+            arrays = [
+                pa.array([_coerce(row[i], kind) for row in batch], type=types[kind])
+                for i, (_, kind) in enumerate(columns)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# Characters that are not allowed in XML 1.0 documents
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def _xlsx_cell(value, kind):
+    if value is None or value == "":
+        return "<c/>"
+    if kind in ("float", "int"):
+        number = _coerce(value, kind)
+        if number is not None:
+            return f"<c><v>{number}</v></c>"
+        # Not a number (e.g. "N/A"): keep the original text
+    text = escape(_XML_ILLEGAL.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_chunks(rows, columns):
+    """Write a single-sheet workbook as a streamed zip.
+
+    The sink cannot seek, so zipfile writes each entry with a trailing data
+    descriptor and the sheet XML can be emitted while rows are produced.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        yield sink.drain()
+
+        with archive.open("xl/worksheets/sheet1.xml", mode="w", force_zip64=True) as sheet:
+            header = "".join(_xlsx_cell(name, "str") for name, _ in columns)
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                f'<sheetData><row>{header}</row>'
+            ).encode("utf-8"))
+            for batch in _batches(rows, CSV_BATCH):
+                xml = "".join(
+                    "<row>" + "".join(_xlsx_cell(value, kind) for value, (_, kind) in zip(row, columns)) + "</row>"
+                    for row in batch
+                )
+                sheet.write(xml.encode("utf-8"))
+                yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
+
+
+def _coerce(value, kind):
+    if value is None or kind == "str":
+        return None if value is None else str(value)
+    try:
+        return float(value) if kind == "float" else int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+_WRITERS = {
+    "csv": _csv_chunks,
+    "json": _ndjson_chunks,
+    "ndjson": _ndjson_chunks,
+    "parquet": _parquet_chunks,
+    "xlsx": _xlsx_chunks,
+}
+
+
+def export_stream(rows, columns, file_format):
+    """Return (chunk generator, mime type, file extension) for streaming rows.
+
+    rows may be any iterable (a list or a lazily iterated DB cursor); it is
+    consumed in batches, so memory stays flat regardless of row count.
+    Raises ValueError for an unsupported format.
+    """
+    writer = _WRITERS.get(file_format)
+    if writer is None:
+        raise ValueError(f"Invalid format: {file_format}")
+    return writer(rows, columns), MIME_TYPES[file_format], EXTENSIONS.get(file_format, file_format)
@@ -0,0 +1,192 @@
+import json
+import re
+import threading
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # orjson is optional; the stdlib parser is just slower
+    _loads = json.loads
+
+JSON_LD_SCRIPT = re.compile(
+    r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL
+)
+CURRENCY_SYMBOLS = {"INR": "₹"}
+
+# Extractors run in this order; each is (name, fn, strategy) where
+# fn(html, selectors) returns [[title, price, rating]] or None. strategy groups
+# extractors for the fetch router: "structured" data or "static" selectors.
+_chain = []
+_stats = {"pages": 0, "misses": 0}
+_lock = threading.Lock()
+
+
+def register_extractor(name, fn, position=None, strategy="static"):
+    """Add an extractor to the chain, at the end or at position"""
+    with _lock:
+        _chain[:] = [entry for entry in _chain if entry[0] != name]
+        _chain.insert(len(_chain) if position is None else position, (name, fn, strategy))
+        _stats.setdefault(name, {"attempts": 0, "hits": 0, "errors": 0})
+
+
+def extractor_strategy(name):
+    """The strategy an extractor belongs to, or None"""
+    with _lock:
+        for entry in _chain:
+            if entry[0] == name:
+                return entry[2]
+    return None
+
+
+def extractor_stats():
+    """Per-extractor attempt/hit counters plus pages no extractor could handle"""
+    with _lock:
+        return {name: dict(value) if isinstance(value, dict) else value for name, value in _stats.items()}
+
+
+def extract_product(html, selectors, strategies=None):
+    """Run the extractor chain over a product page.
+
+    Only extractors of the given strategies run when strategies is set.
+    Returns (data, extractor name), or (None, None) when every extractor
+    missed and the caller has to fall back to the browser.
+    """
+    with _lock:
+        chain = [entry for entry in _chain if strategies is None or entry[2] in strategies]
+        _stats["pages"] += 1
+    for name, fn, _ in chain:
+        try:
+            data = fn(html, selectors)
+        except Exception as e:
+            print(f"Error in {name} extractor: {e}")
+            data = None
+            _count(name, "errors")
+        _count(name, "attempts")
+        if data:
+            _count(name, "hits")
+            return data, name
+    with _lock:
+        _stats["misses"] += 1
+    return None, None
+
+
+def _count(name, field):
+    with _lock:
+        _stats[name][field] += 1
+
+
+def _format_price(value, currency=None):
+    try:
+        amount = float(str(value).replace(",", ""))
+    except ValueError:
+        return str(value)
+    symbol = CURRENCY_SYMBOLS.get(currency)
+    return f"{symbol}{amount:,.2f}" if symbol else f"{amount:.2f}"
+
+
+def _walk(node):
+    """Yield every dict nested anywhere in a decoded JSON document"""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            yield node
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def _is_product(node):
+    types = node.get("@type")
+    return "Product" in (types if isinstance(types, list) else [types])
+
+
+def extract_json_ld(html, selectors):
+    """schema.org Product/Offer data from application/ld+json blocks"""
+    for match in JSON_LD_SCRIPT.finditer(html):
+        try:
+            document = _loads(match.group(1).strip())
+        except ValueError:
+            continue
+        for node in _walk(document):
+            if not _is_product(node):
+                continue
+            offers = node.get("offers") or {}
+            if isinstance(offers, list):
+                offers = offers[0] if offers else {}
+            price = offers.get("price") or offers.get("lowPrice")
+            if price is None or not node.get("name"):
+                continue
+            rating = (node.get("aggregateRating") or {}).get("ratingValue")
+            return [[
+                str(node["name"]).strip(),
+                _format_price(price, offers.get("priceCurrency")),
+                str(rating) if rating is not None else "N/A",
+            ]]
+    return None
+
+
+def _find_key(document, keys):
+    for key in keys:
+        for node in _walk(document):
+            if key in node and node[key] not in (None, "", {}):
+                value = node[key]
+                if isinstance(value, dict):
+                    value = value.get("value", value.get("decimalValue"))
+                if value is not None:
+                    return value
+    return None
+
+
+def extract_embedded_state(html, selectors):
+    """Fields from a JSON state blob assigned in an inline script.
+
+    selectors["embedded_state"] names the assignment marker (for example
+    "window.__INITIAL_STATE__") and, per field, the keys to look for.
+    """
+    config = selectors.get("embedded_state")
+    if not config:
+        return None
+    start = html.find(config["marker"])
+    if start == -1:
+        return None
+    start = html.find("{", start)
+    end = html.find("</script>", start)
+    if start == -1 or end == -1:
+        return None
+    try:
+        document = _loads(html[start:end].strip().rstrip(";"))
+    except ValueError:
+        return None
+
+    keys = config.get("keys", {})
+    title = _find_key(document, keys.get("title", []))
+    price = _find_key(document, keys.get("price", []))
+    if not title or price is None:
+        return None
+    rating = _find_key(document, keys.get("rating", []))
+    return [[str(title).strip(), _format_price(price, config.get("currency")),
+             str(rating) if rating is not None else "N/A"]]
+
+
+def extract_css(html, selectors):
+    """The product_css rules from selectors.json, applied with BeautifulSoup"""
+    rules = selectors.get("product_css")
+    if not rules:
+        return None
+    # Imported on first use; most pages are answered by the structured extractors
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    values = {}
+    for field in ("title", "price", "rating"):
+        element = soup.select_one(rules[field]) if rules.get(field) else None
+        values[field] = element.text.strip() if element else ""
+    if values["title"] and values["price"]:
+        return [[values["title"], values["price"], values["rating"] or "N/A"]]
+    return None
+
+
+register_extractor("json_ld", extract_json_ld, strategy="structured")
+register_extractor("embedded_state", extract_embedded_state, strategy="structured")
+register_extractor("css", extract_css)
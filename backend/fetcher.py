@@ -0,0 +1,225 @@
+import asyncio
+import codecs
+import importlib.util
+import os
+import threading
+from collections import namedtuple
+from urllib.parse import urlparse
+from ratelimit import rate_limiter, backoff_delay, parse_retry_after
+
+# Concurrency and connection settings, overridable from the environment
+MAX_CONCURRENCY = int(os.getenv("FETCH_MAX_CONCURRENCY", "50"))
+PER_DOMAIN_CONCURRENCY = int(os.getenv("FETCH_PER_DOMAIN_CONCURRENCY", "8"))
+TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+KEEPALIVE_CONNECTIONS = int(os.getenv("FETCH_KEEPALIVE_CONNECTIONS", "20"))
+USE_HTTP2 = os.getenv("FETCH_HTTP2", "1") == "1"
+# Retries for throttled (429/503/captcha) responses
+MAX_RETRIES = int(os.getenv("FETCH_MAX_RETRIES", "2"))
+# Optional HTTP proxy for all scraper traffic, e.g. the offline benchmark server
+PROXY = os.getenv("SCRAPER_PROXY") or None
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-IN,en;q=0.9',
+}
+
+# Outcome of a single fetch; status is None when the request itself failed
+FetchResult = namedtuple("FetchResult", ["url", "status", "text", "headers", "error"])
+
+
+def _http2_available():
+    return importlib.util.find_spec("h2") is not None
+
+
+class Fetcher:
+    """Asyncio HTTP client running on a dedicated event loop thread.
+
+    A single httpx.AsyncClient keeps persistent (HTTP/2 when available)
+    connections per host, so repeated fetches skip the TCP/TLS handshake.
+    Requests are bounded by a global semaphore and one semaphore per host.
+    Synchronous callers (Flask views, thread pools) use fetch/fetch_many.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, per_domain=PER_DOMAIN_CONCURRENCY, timeout=TIMEOUT):
+        self._max_concurrency = max_concurrency
+        self._per_domain = per_domain
+        self._timeout = timeout
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._http_error = None
+        self._global_limit = None
+        self._domain_limits = {}
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._loop is not None:
+            return
+        with self._lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="fetcher-loop", daemon=True)
+            thread.start()
+            asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+            self._thread = thread
+            self._loop = loop
+
+    async def _open(self):
+        # httpx is only imported once the first request is made
+        import httpx
+
+        self._http_error = httpx.HTTPError
+        limits = httpx.Limits(
+            max_connections=self._max_concurrency,
+            max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+        )
+        self._client = httpx.AsyncClient(
+            http2=USE_HTTP2 and _http2_available(),
+            limits=limits,
+            timeout=self._timeout,
+            headers=DEFAULT_HEADERS,
+            follow_redirects=True,
+            proxy=PROXY,
+        )
+        self._global_limit = asyncio.Semaphore(self._max_concurrency)
+
+    def _domain_limit(self, host):
+        limit = self._domain_limits.get(host)
+        if limit is None:
+            limit = asyncio.Semaphore(self._per_domain)
+            self._domain_limits[host] = limit
+        return limit
+
+    async def fetch_async(self, url, headers=None):
+        """Fetch one URL on the fetcher loop, never raising for network errors"""
+        return await self._request(url, lambda: self._get(url, headers))
+
+    async def scan_async(self, url, scanner, headers=None):
+        """Stream one URL into scanner.feed(), stopping once it returns True.
+
+        The FetchResult text holds only what was read before stopping. The
+        scanner is reset() before every attempt, so a retry after a throttled
+        response starts from a clean scanner.
+        """
+        return await self._request(url, lambda: self._scan(url, scanner, headers))
+
+    async def _get(self, url, headers):
+        response = await self._client.get(url, headers=headers)
+        return FetchResult(url, response.status_code, response.text, response.headers, None)
+
+    async def _scan(self, url, scanner, headers):
+        scanner.reset()
+        async with self._client.stream("GET", url, headers=headers) as response:
+            if response.status_code != 200:
+                await response.aread()
+                return FetchResult(url, response.status_code, response.text, response.headers, None)
+            decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+            parts = []
+            async for chunk in response.aiter_bytes():
+                parts.append(decoder.decode(chunk))
+                # Leaving the block closes the stream, so the rest of the body is never downloaded
+                if scanner.feed(parts[-1]):
+                    break
+            return FetchResult(url, response.status_code, "".join(parts), response.headers, None)
+
+    async def _request(self, url, send):
+        """Run send() under the rate limiter and concurrency limits.
+
+        Each attempt waits for the host's rate limiter. Throttled responses
+        (429/503/captcha pages) are retried up to MAX_RETRIES times after a
+        jittered backoff; if they persist the result carries an error.
+        """
+        host = urlparse(url).netloc
+        for attempt in range(MAX_RETRIES + 1):
+            await rate_limiter.acquire_async(url)
+            async with self._global_limit, self._domain_limit(host):
+                try:
+                    result = await send()
+                except self._http_error as e:
+                    return FetchResult(url, None, None, {}, f"{type(e).__name__}: {e}")
+
+            retry_after = parse_retry_after(result.headers.get("retry-after"))
+            if not rate_limiter.observe(url, result.status, result.text, retry_after, attempt):
+                return result
+            if attempt < MAX_RETRIES:
+                await asyncio.sleep(retry_after or backoff_delay(attempt))
+
+        return result._replace(error=f"Blocked by {host} (HTTP {result.status})")
+
+    async def _fetch_all(self, urls, headers, url_headers):
+        return await asyncio.gather(*(
+            self.fetch_async(url, merge_headers(headers, url_headers, url)) for url in urls
+        ))
+
+    async def _scan_all(self, scans, headers, url_headers):
+        return await asyncio.gather(*(
+            self.scan_async(url, scanner, merge_headers(headers, url_headers, url)) for url, scanner in scans
+        ))
+
+    def run(self, coroutine):
+        """Run a coroutine on the fetcher loop and wait for its result"""
+        self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def fetch(self, url, headers=None):
+        """Fetch a single URL using the pooled connections"""
+        return self.run(self.fetch_async(url, headers))
+
+    def fetch_many(self, urls, headers=None, url_headers=None):
+        """Fetch many URLs concurrently; results are returned in input order.
+
+        url_headers maps a URL to headers sent with that request only, such
+        as the validators of a cached copy.
+        """
+        if not urls:
+            return []
+        return self.run(self._fetch_all(list(urls), headers, url_headers))
+
+    def scan_many(self, scans, headers=None, url_headers=None):
+        """Stream several (url, scanner) pairs concurrently; results are in input order"""
+        if not scans:
+            return []
+        return self.run(self._scan_all(list(scans), headers, url_headers))
+
+    def close(self):
+        """Close pooled connections and stop the loop thread"""
+        with self._lock:
+            if self._loop is None:
+                return
+            loop, self._loop = self._loop, None
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=5)
+        self._domain_limits = {}
+
+
+def merge_headers(headers, url_headers, url):
+    """headers plus any url_headers given for url"""
+    extra = url_headers.get(url) if url_headers else None
+    if not extra:
+        return headers
+    return {**(headers or {}), **extra}
+
+
+_fetcher = Fetcher()
+
+
+def fetch_page(url, headers=None):
+    """Fetch a single page through the shared connection pool"""
+    return _fetcher.fetch(url, headers)
+
+
+def fetch_pages(urls, headers=None, url_headers=None):
+    """Fetch several pages concurrently through the shared connection pool"""
+    return _fetcher.fetch_many(urls, headers, url_headers)
+
+
+def scan_pages(scans, headers=None, url_headers=None):
+    """Stream (url, scanner) pairs, stopping each download once its scanner is satisfied"""
+    return _fetcher.scan_many(scans, headers, url_headers)
+
+
+def close_fetcher():
+    _fetcher.close()
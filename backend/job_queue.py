@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from connections import get_connection
+
+QUEUE_DATABASE = os.getenv("JOB_QUEUE_DATABASE", "jobs.db")
+# A leased job becomes visible to other workers again if it isn't heartbeated within this window
+VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Failed jobs are retried after RETRY_BASE * 2 ** (attempt - 1) seconds
+RETRY_BASE = int(os.getenv("JOB_RETRY_BASE", "30"))
+# Finished and dead jobs are purged after this long
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", str(7 * 24 * 3600)))
+
+# When set, the web tier hands scrapes to worker.py processes instead of running them itself
+QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "0") == "1"
+
+FINISHED_STATUSES = ("done", "dead")
+
+# A job handed to a worker; attempts includes the current one
+Job = namedtuple("Job", ["id", "kind", "payload", "attempts", "max_attempts"])
+
+
+class JobQueue:
+    """Durable job queue in a local SQLite file shared by web and worker processes.
+
+    Workers lease the oldest visible job inside a BEGIN IMMEDIATE transaction,
+    so two processes never receive the same job. A lease hides the job for
+    the visibility timeout; workers extend it with heartbeat() while they run.
+    If a worker or its browser dies, the lease expires and another worker
+    picks the job up again, until max_attempts is reached and it is marked dead.
+    """
+
+    def __init__(self, path=QUEUE_DATABASE):
+        self._path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = get_connection(self._path)
+        if not self._initialized:
+            with self._lock:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        kind TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'queued',
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        max_attempts INTEGER NOT NULL,
+                        visible_at REAL NOT NULL,
+                        leased_by TEXT,
+                        result TEXT,
+                        error TEXT,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                ''')
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_visible ON jobs(status, visible_at)")
+                conn.commit()
+                self._initialized = True
+        return conn
+
+    def enqueue(self, kind, payload, max_attempts=MAX_ATTEMPTS, delay=0):
+        """Add a job and return its id"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                INSERT INTO jobs (kind, payload, max_attempts, visible_at, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (kind, json.dumps(payload), max_attempts, now + delay, now, now))
+        return cursor.lastrowid
+
+    def lease(self, worker_id, kinds=None, visibility=VISIBILITY_TIMEOUT):
+        """Claim the oldest visible job for worker_id, or return None if there is none"""
+        conn = self._connect()
+        now = time.time()
+        kind_filter = ""
+        params = [now]
+        if kinds:
+            kind_filter = f" AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+
+        # IMMEDIATE takes the write lock up front so the select and update can't interleave
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases that already used their last attempt died with their worker
+            conn.execute('''
+                UPDATE jobs SET status = 'dead', error = 'Lease expired', leased_by = NULL, updated_at = ?
+                WHERE status = 'running' AND visible_at <= ? AND attempts >= max_attempts
+            ''', (now, now))
+            row = conn.execute(f'''
+                SELECT id, kind, payload, attempts, max_attempts FROM jobs
+                WHERE status IN ('queued', 'running') AND visible_at <= ?{kind_filter}
+                ORDER BY visible_at, id LIMIT 1
+            ''', params).fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            conn.execute('''
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, leased_by = ?,
+                    visible_at = ?, updated_at = ?
+                WHERE id = ?
+            ''', (worker_id, now + visibility, now, row["id"]))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return Job(row["id"], row["kind"], json.loads(row["payload"]), row["attempts"] + 1, row["max_attempts"])
+
+    def heartbeat(self, job_id, worker_id, visibility=VISIBILITY_TIMEOUT):
+        """Extend a lease; returns False if the job is no longer leased by worker_id"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                UPDATE jobs SET visible_at = ?, updated_at = ?
+                WHERE id = ? AND leased_by = ? AND status = 'running'
+            ''', (now + visibility, now, job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, result=None):
+        """Mark a leased job done and store its JSON result"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                UPDATE jobs SET status = 'done', result = ?, error = NULL, leased_by = NULL, updated_at = ?
+                WHERE id = ? AND leased_by = ? AND status = 'running'
+            ''', (json.dumps(result), now, job_id, worker_id))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error):
+        """Record a failed attempt: requeue with backoff, or mark dead after max_attempts"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND leased_by = ? AND status = 'running'",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                return None
+            status = "dead" if row["attempts"] >= row["max_attempts"] else "queued"
+            retry_at = now + RETRY_BASE * 2 ** (row["attempts"] - 1)
+            conn.execute('''
+                UPDATE jobs SET status = ?, error = ?, leased_by = NULL, visible_at = ?, updated_at = ?
+                WHERE id = ?
+            ''', (status, str(error), retry_at, now, job_id))
+        return status
+
+    def get(self, job_id):
+        """Return a job's status row as a dict, or None"""
+        row = self._connect().execute('''
+            SELECT id, kind, status, attempts, max_attempts, result, error, created_at, updated_at
+            FROM jobs WHERE id = ?
+        ''', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def purge(self, retention=JOB_RETENTION):
+        """Delete finished and dead jobs older than retention seconds"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'dead') AND updated_at < ?",
+                (time.time() - retention,)
+            )
+        return cursor.rowcount
+
+    def stats(self):
+        """Job counts per status"""
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+
+job_queue = JobQueue()
@@ -0,0 +1,77 @@
+import html
+import os
+import re
+
+# Characters of the previous window kept when the next chunk arrives, so a
+# match that straddles a chunk boundary is still found. Patterns must span less.
+OVERLAP = 8192
+# Once the price is found, read at most this much further looking for the rating
+RATING_LOOKAHEAD = int(os.getenv("PRICE_SCAN_RATING_LOOKAHEAD", "65536"))
+# Give up streaming (and fall back to the full parse) after this much text
+MAX_SCAN_CHARS = int(os.getenv("PRICE_SCAN_MAX_CHARS", str(4 * 1024 * 1024)))
+
+FIELDS = ("price", "rating", "title")
+
+_compiled = {}
+
+
+def compile_patterns(patterns):
+    """Compile {field: [regex, ...]} from selectors.json, cached per pattern string"""
+    compiled = {}
+    for field in FIELDS:
+        compiled[field] = []
+        for pattern in patterns.get(field, []):
+            regex = _compiled.get(pattern)
+            if regex is None:
+                regex = re.compile(pattern, re.DOTALL)
+                _compiled[pattern] = regex
+            compiled[field].append(regex)
+    return compiled
+
+
+class PriceScanner:
+    """Finds price, rating and title in a page as its body streams in.
+
+    Each chunk is searched together with the tail of the previous window
+    instead of the whole document. feed() returns True as soon as the price
+    and rating are known (or the rating lookahead after the price is used
+    up), telling the caller it can stop downloading.
+    """
+
+    def __init__(self, patterns):
+        self._patterns = compile_patterns(patterns)
+        self.reset()
+
+    def reset(self):
+        """Forget everything fed so far, e.g. before a retried download"""
+        self._window = ""
+        self.found = {}
+        self.scanned = 0
+        self._price_at = None
+
+    def feed(self, chunk):
+        self._window = self._window[-OVERLAP:] + chunk
+        self.scanned += len(chunk)
+        for field, regexes in self._patterns.items():
+            if field in self.found:
+                continue
+            for regex in regexes:
+                match = regex.search(self._window)
+                if match:
+                    self.found[field] = html.unescape(match.group(field)).strip()
+                    break
+        if "price" in self.found and self._price_at is None:
+            self._price_at = self.scanned
+        return self.done
+
+    @property
+    def done(self):
+        if self._price_at is None:
+            return self.scanned >= MAX_SCAN_CHARS
+        return "rating" in self.found or self.scanned - self._price_at >= RATING_LOOKAHEAD
+
+    def product(self):
+        """[[title, price, rating]] like the full parsers, or None without a price"""
+        if "price" not in self.found:
+            return None
+        return [[self.found.get("title", ""), self.found["price"], self.found.get("rating", "N/A")]]
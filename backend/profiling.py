@@ -0,0 +1,149 @@
+import argparse
+import cProfile
+import glob
+import hmac
+import itertools
+import os
+import pstats
+import random
+import re
+import threading
+import time
+
+# Request profiling is opt-in: with PROFILE_ENABLED unset the app is not wrapped at all
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"
+# Requests sent with "X-Profile: <PROFILE_TOKEN>" are always profiled
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_HEADER = "HTTP_X_PROFILE"
+# Fraction of all other requests to profile
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9]+")
+
+
+class ProfilingMiddleware:
+    """WSGI middleware that runs selected requests under cProfile.
+
+    The profiler is on while the app handles the request and while it
+    produces each chunk of a streamed response; the dump is written to
+    profile_dir when the response is closed. Only one request is profiled at
+    a time (cProfile cannot nest), so a request that comes in while another
+    is being profiled runs normally. Work handed off to other threads, such
+    as the fetcher's event loop, does not show up in the dump.
+    """
+
+    def __init__(self, app, profile_dir=PROFILE_DIR, token=PROFILE_TOKEN, sample_rate=PROFILE_SAMPLE_RATE):
+        self._app = app
+        self._profile_dir = profile_dir
+        self._token = token
+        self._sample_rate = sample_rate
+        self._busy = threading.Lock()
+        self._sequence = itertools.count(1)
+        os.makedirs(profile_dir, exist_ok=True)
+
+    def _wanted(self, environ):
+        header = environ.get(PROFILE_HEADER)
+        if header and self._token and hmac.compare_digest(header, self._token):
+            return True
+        return self._sample_rate > 0 and random.random() < self._sample_rate
+
+    def _dump_path(self, environ):
+        route = _UNSAFE.sub("_", environ.get("PATH_INFO", "")).strip("_") or "root"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{environ.get('REQUEST_METHOD', 'GET')}-{route[:60]}-{os.getpid()}-{next(self._sequence)}.prof"
+        return os.path.join(self._profile_dir, name)
+
+    def __call__(self, environ, start_response):
+        if not self._wanted(environ) or not self._busy.acquire(blocking=False):
+            return self._app(environ, start_response)
+
+        path = self._dump_path(environ)
+
+        def profiled_start_response(status, headers, exc_info=None):
+            return start_response(status, headers + [("X-Profile-Dump", os.path.basename(path))], exc_info)
+
+        profile = cProfile.Profile()
+        try:
+            body = profile.runcall(self._app, environ, profiled_start_response)
+        except BaseException:
+            self._finish(profile, path)
+            raise
+        return _ProfiledBody(body, profile, lambda: self._finish(profile, path))
+
+    def _finish(self, profile, path):
+        try:
+            profile.dump_stats(path)
+        except Exception as e:
+            print(f"Error writing profile {path}: {e}")
+        finally:
+            self._busy.release()
+
+
+class _ProfiledBody:
+    """Response iterable that keeps profiling while the body is produced"""
+
+    def __init__(self, body, profile, finish):
+        self._body = body
+        self._iterator = iter(body)
+        self._profile = profile
+        self._finish = finish
+        self._finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self._profile.runcall(next, self._iterator)
+        except StopIteration:
+            # Don't rely on the server calling close() to write the dump
+            self._done()
+            raise
+
+    def close(self):
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            self._done()
+
+    def _done(self):
+        if not self._finished:
+            self._finished = True
+            self._finish()
+
+
+def install_profiler(app):
+    """Wrap a Flask app's WSGI callable when PROFILE_ENABLED is set; returns whether it did"""
+    if not PROFILE_ENABLED:
+        return False
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app)
+    return True
+
+
+def summarize(directory, top=30, sort="cumulative", match=None):
+    """Print the top functions across every dump in directory (optionally only names containing match)"""
+    paths = sorted(glob.glob(os.path.join(directory, "*.prof")))
+    if match:
+        paths = [path for path in paths if match in os.path.basename(path)]
+    if not paths:
+        print(f"No profiles found in {directory}")
+        return 0
+    stats = pstats.Stats(*paths)
+    print(f"{len(paths)} profiles from {directory}")
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return len(paths)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work with request profiles written by ProfilingMiddleware")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary = commands.add_parser("summarize", help="aggregate dumps and list the most expensive functions")
+    summary.add_argument("directory", nargs="?", default=PROFILE_DIR)
+    summary.add_argument("--top", type=int, default=30)
+    summary.add_argument("--sort", default="cumulative", choices=["cumulative", "tottime", "ncalls"])
+    summary.add_argument("--match", help="only dumps whose file name contains this, e.g. download")
+    args = parser.parse_args()
+
+    if args.command == "summarize":
+        summarize(args.directory, args.top, args.sort, args.match)
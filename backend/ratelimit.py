@@ -0,0 +1,149 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+# Defaults for every host; per-domain overrides come from configure()
+DEFAULT_SETTINGS = {
+    "initial_rps": float(os.getenv("RATE_LIMIT_INITIAL_RPS", "2")),
+    "min_rps": float(os.getenv("RATE_LIMIT_MIN_RPS", "0.2")),
+    "max_rps": float(os.getenv("RATE_LIMIT_MAX_RPS", "10")),
+    "burst": float(os.getenv("RATE_LIMIT_BURST", "5")),
+    # Additive increase per successful response, multiplicative decrease per throttle
+    "increase_rps": 0.1,
+    "decrease_factor": 0.5,
+    "captcha_markers": [],
+}
+RETRY_BASE_SECONDS = float(os.getenv("RATE_LIMIT_RETRY_BASE", "1"))
+RETRY_MAX_SECONDS = float(os.getenv("RATE_LIMIT_RETRY_MAX", "60"))
+THROTTLE_STATUSES = {429, 503}
+# Only the start of a page is searched for captcha markers
+CAPTCHA_SCAN_BYTES = 20000
+
+
+class HostLimiter:
+    """Token bucket for one host whose refill rate adapts AIMD-style"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.rate = settings["initial_rps"]
+        self.tokens = settings["burst"]
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.throttled = 0
+        self.requests = 0
+
+    def reserve(self, now):
+        """Take a token and return how long the caller must wait before using it"""
+        self.tokens = min(self.settings["burst"], self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        self.requests += 1
+        wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+        return max(wait, self.paused_until - now)
+
+    def on_success(self):
+        self.rate = min(self.settings["max_rps"], self.rate + self.settings["increase_rps"])
+
+    def on_throttle(self, now, pause):
+        self.rate = max(self.settings["min_rps"], self.rate * self.settings["decrease_factor"])
+        self.paused_until = max(self.paused_until, now + pause)
+        self.throttled += 1
+
+
+class RateLimiter:
+    """Per-host politeness scheduler shared by the HTTP and browser paths.
+
+    Every request first reserves a token from its host's bucket. Responses
+    are reported back with observe(): successes raise the host's rate by a
+    fixed step, while 429/503 responses and captcha pages halve it and pause
+    the host for a jittered backoff (or the server's Retry-After).
+    """
+
+    def __init__(self):
+        self._overrides = {}
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def configure(self, pattern, **settings):
+        """Override settings for hosts containing pattern (e.g. "amazon")"""
+        with self._lock:
+            self._overrides.setdefault(pattern, {}).update(settings)
+            self._limiters = {}
+
+    def _limiter(self, host):
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            settings = dict(DEFAULT_SETTINGS)
+            for pattern, overrides in self._overrides.items():
+                if pattern in host:
+                    settings.update(overrides)
+            limiter = HostLimiter(settings)
+            self._limiters[host] = limiter
+        return limiter
+
+    def _reserve(self, url):
+        with self._lock:
+            return self._limiter(urlparse(url).netloc).reserve(time.monotonic())
+
+    def acquire(self, url):
+        """Block the calling thread until a request to url's host is allowed"""
+        wait = self._reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, url):
+        """Wait on the event loop until a request to url's host is allowed"""
+        wait = self._reserve(url)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def is_blocked(self, url, status, text=None):
+        """True for throttling statuses and pages that contain a captcha marker"""
+        if status in THROTTLE_STATUSES:
+            return True
+        if status != 200 or not text:
+            return False
+        with self._lock:
+            markers = self._limiter(urlparse(url).netloc).settings["captcha_markers"]
+        head = text[:CAPTCHA_SCAN_BYTES]
+        return any(marker in head for marker in markers)
+
+    def observe(self, url, status, text=None, retry_after=None, attempt=0):
+        """Report a response; returns True (and backs the host off) if it was throttled"""
+        if status is None:
+            return False
+        blocked = self.is_blocked(url, status, text)
+        with self._lock:
+            limiter = self._limiter(urlparse(url).netloc)
+            if blocked:
+                limiter.on_throttle(time.monotonic(), retry_after or backoff_delay(attempt))
+            else:
+                limiter.on_success()
+        return blocked
+
+    def stats(self):
+        """Current rate and throttle counts per host"""
+        with self._lock:
+            return {
+                host: {"rate": round(limiter.rate, 3), "requests": limiter.requests, "throttled": limiter.throttled}
+                for host, limiter in self._limiters.items()
+            }
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for retry number attempt"""
+    return random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt)) + RETRY_BASE_SECONDS
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header (only the delta-seconds form)"""
+    try:
+        return min(RETRY_MAX_SECONDS, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "900"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Number of users whose last result set is kept for /download
+MAX_USER_RESULTS = int(os.getenv("SEARCH_MAX_USER_RESULTS", "1000"))
+
+
+def search_key(platform, query, page=1):
+    """Normalized (platform, query, page) key for a search"""
+    return ((platform or "").strip().lower(), " ".join((query or "").lower().split()), int(page))
+
+
+def estimate_size(results):
+    """Approximate memory used by a list of scraped records"""
+    size = sys.getsizeof(results)
+    for record in results:
+        size += sys.getsizeof(record)
+        for field in record:
+            size += sys.getsizeof(field)
+    return size
+
+
+class ResultStore:
+    """In-memory search result cache with a TTL and a memory budget.
+
+    Result sets are evicted least recently used first once their estimated
+    size exceeds max_bytes. Each user's most recent result set is tracked
+    separately so /download returns that user's data, not the last search
+    anyone ran.
+    """
+
+    def __init__(self, ttl=SEARCH_CACHE_TTL, max_bytes=SEARCH_CACHE_MAX_BYTES, max_users=MAX_USER_RESULTS):
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._max_users = max_users
+        self._entries = OrderedDict()
+        self._user_results = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return cached results for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, size, results = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return results
+
+    def put(self, key, results):
+        """Cache results for key, evicting older result sets to stay in budget"""
+        size = estimate_size(results)
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + self._ttl, size, results)
+            self._bytes += size
+            while self._bytes > self._max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def set_user_results(self, user_id, results):
+        """Remember results as user_id's latest result set"""
+        with self._lock:
+            self._user_results[user_id] = results
+            self._user_results.move_to_end(user_id)
+            while len(self._user_results) > self._max_users:
+                self._user_results.popitem(last=False)
+
+    def get_user_results(self, user_id):
+        with self._lock:
+            return self._user_results.get(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "users": len(self._user_results)}
+
+
+result_store = ResultStore()
@@ -0,0 +1,184 @@
+import os
+import random
+import re
+import threading
+import time
+from urllib.parse import urlparse
+from connections import get_connection
+
+ROUTER_DATABASE = os.getenv("ROUTER_DATABASE", "routing.db")
+# Strategies in order of cost; the browser is always the last resort
+STRATEGIES = ("structured", "static", "browser")
+# Weight of the newest outcome in the moving averages
+EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.2"))
+# A strategy is skipped once its success rate falls below this...
+MIN_SUCCESS = float(os.getenv("ROUTER_MIN_SUCCESS", "0.2"))
+# ...provided it has at least this many observations
+MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "10"))
+# Skipped strategies are still probed on this fraction of calls, and at least once per interval
+PROBE_RATE = float(os.getenv("ROUTER_PROBE_RATE", "0.05"))
+PROBE_INTERVAL = int(os.getenv("ROUTER_PROBE_INTERVAL", "600"))
+# Stats are written back to SQLite at most this often
+FLUSH_SECONDS = int(os.getenv("ROUTER_FLUSH_SECONDS", "30"))
+
+# Domain-wide stats are kept under this pattern and used for unseen URL patterns
+ANY_PATTERN = "*"
+_KEYWORD_SEGMENT = re.compile(r"^[a-z]{1,12}$", re.IGNORECASE)
+
+
+def url_pattern(url):
+    """Reduce a URL path to a pattern such as "*/dp/*" by masking slugs and ids"""
+    segments = [segment for segment in urlparse(url).path.split("/") if segment][:4]
+    return "/".join(segment if _KEYWORD_SEGMENT.match(segment) else "*" for segment in segments) or "/"
+
+
+class StrategyStats:
+    """Moving averages of one strategy's success rate and latency"""
+
+    __slots__ = ("success", "latency", "samples", "last_tried")
+
+    def __init__(self, success=1.0, latency=0.0, samples=0, last_tried=0.0):
+        self.success = success
+        self.latency = latency
+        self.samples = samples
+        self.last_tried = last_tried
+
+    def record(self, ok, latency, now):
+        # latency is None for attempts timed as part of a batch
+        if self.samples == 0:
+            self.success = float(ok)
+        else:
+            self.success += EWMA_ALPHA * (float(ok) - self.success)
+        if latency is not None:
+            self.latency = latency if self.latency == 0.0 else self.latency + EWMA_ALPHA * (latency - self.latency)
+        self.samples += 1
+        self.last_tried = now
+
+
+class StrategyRouter:
+    """Chooses how to fetch a product page from observed outcomes.
+
+    Outcomes are tracked per (domain, URL pattern, strategy) and per domain.
+    plan() returns the strategies to try in order of cost. A cheap strategy
+    is left out once it keeps failing, except for occasional probes that
+    notice when it starts working again. Stats are persisted to SQLite so a
+    restarted process keeps its routing decisions.
+    """
+
+    def __init__(self, path=ROUTER_DATABASE):
+        self._path = path
+        self._stats = None
+        self._dirty = set()
+        self._decisions = {}
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = get_connection(self._path)
+        if not self._initialized:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS strategy_stats (
+                    domain TEXT NOT NULL,
+                    pattern TEXT NOT NULL,
+                    strategy TEXT NOT NULL,
+                    success REAL NOT NULL,
+                    latency REAL NOT NULL,
+                    samples INTEGER NOT NULL,
+                    last_tried REAL NOT NULL,
+                    PRIMARY KEY (domain, pattern, strategy)
+                ) WITHOUT ROWID
+            ''')
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _load(self):
+        # Caller holds self._lock
+        if self._stats is None:
+            self._stats = {}
+            try:
+                for row in self._connect().execute("SELECT * FROM strategy_stats"):
+                    key = (row["domain"], row["pattern"], row["strategy"])
+                    self._stats[key] = StrategyStats(row["success"], row["latency"], row["samples"], row["last_tried"])
+            except Exception as e:
+                print(f"Error loading routing stats: {e}")
+        return self._stats
+
+    def _lookup(self, domain, pattern, strategy):
+        stats = self._load()
+        found = stats.get((domain, pattern, strategy))
+        if found is None or found.samples < MIN_SAMPLES:
+            found = stats.get((domain, ANY_PATTERN, strategy), found)
+        return found
+
+    def _usable(self, stats, now):
+        if stats is None or stats.samples < MIN_SAMPLES or stats.success >= MIN_SUCCESS:
+            return True
+        return now - stats.last_tried >= PROBE_INTERVAL or random.random() < PROBE_RATE
+
+    def plan(self, domain, url):
+        """Strategies to try for url, cheapest first; always ends with "browser"."""
+        pattern = url_pattern(url)
+        now = time.time()
+        with self._lock:
+            chosen = [
+                strategy for strategy in STRATEGIES[:-1]
+                if self._usable(self._lookup(domain, pattern, strategy), now)
+            ] + ["browser"]
+            decision = (domain, pattern, "+".join(chosen))
+            self._decisions[decision] = self._decisions.get(decision, 0) + 1
+        return chosen
+
+    def record(self, domain, url, strategy, ok, latency=None):
+        """Report the outcome of one strategy attempt"""
+        now = time.time()
+        with self._lock:
+            stats = self._load()
+            for pattern in (url_pattern(url), ANY_PATTERN):
+                key = (domain, pattern, strategy)
+                if key not in stats:
+                    stats[key] = StrategyStats()
+                stats[key].record(ok, latency, now)
+                self._dirty.add(key)
+            due = now - self._last_flush >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write changed stats to SQLite"""
+        with self._lock:
+            self._last_flush = time.time()
+            rows = [
+                key + (stats.success, stats.latency, stats.samples, stats.last_tried)
+                for key, stats in ((key, self._stats[key]) for key in self._dirty)
+            ]
+            self._dirty = set()
+        if not rows:
+            return 0
+        try:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO strategy_stats VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        except Exception as e:
+            print(f"Error saving routing stats: {e}")
+        return len(rows)
+
+    def stats(self):
+        """Current per-strategy stats and how often each plan was chosen"""
+        with self._lock:
+            strategies = [
+                {
+                    "domain": domain, "pattern": pattern, "strategy": strategy,
+                    "success_rate": round(stats.success, 3), "latency": round(stats.latency, 3),
+                    "samples": stats.samples, "last_tried": stats.last_tried,
+                }
+                for (domain, pattern, strategy), stats in sorted(self._load().items())
+            ]
+            decisions = [
+                {"domain": domain, "pattern": pattern, "plan": plan, "count": count}
+                for (domain, pattern, plan), count in sorted(self._decisions.items())
+            ]
+        return {"strategies": strategies, "decisions": decisions}
+
+
+strategy_router = StrategyRouter()
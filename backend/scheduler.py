@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from scraper import fetch_products
+from db import get_due_products, update_product_prices, compact_price_history
+from job_queue import job_queue, QUEUE_ENABLED, FINISHED_STATUSES
+from alerts import dispatch_pending
+
+# Refresh cadence: normal products every REFRESH_INTERVAL seconds, products
+# within REFRESH_THRESHOLD_MARGIN of their price threshold every REFRESH_HOT_INTERVAL
+REFRESH_INTERVAL = int(os.getenv("REFRESH_INTERVAL", str(6 * 3600)))
+REFRESH_HOT_INTERVAL = int(os.getenv("REFRESH_HOT_INTERVAL", "1800"))
+REFRESH_THRESHOLD_MARGIN = float(os.getenv("REFRESH_THRESHOLD_MARGIN", "0.1"))
+REFRESH_POLL_SECONDS = int(os.getenv("REFRESH_POLL_SECONDS", "60"))
+REFRESH_WORKERS = int(os.getenv("REFRESH_WORKERS", "2"))
+REFRESH_BATCH_SIZE = int(os.getenv("REFRESH_BATCH_SIZE", "50"))
+# Maximum products the periodic scan enqueues per poll
+REFRESH_SCAN_LIMIT = int(os.getenv("REFRESH_SCAN_LIMIT", "1000"))
+# A product whose refresh failed waits this long before the scan retries it,
+# doubling per consecutive failure up to REFRESH_INTERVAL
+REFRESH_RETRY_BASE = int(os.getenv("REFRESH_RETRY_BASE", "900"))
+MAX_JOB_HISTORY = 1000
+
+# Raw price points older than this are compacted into daily rollups
+HISTORY_RAW_RETENTION = int(os.getenv("HISTORY_RAW_RETENTION_DAYS", "30")) * 24 * 3600
+# Daily rollups older than this are dropped (0 keeps them forever)
+HISTORY_ROLLUP_RETENTION = int(os.getenv("HISTORY_ROLLUP_RETENTION_DAYS", "730")) * 24 * 3600
+HISTORY_COMPACT_EVERY = 24 * 3600
+
+
+def refresh_prices(urls, raise_errors=False):
+    """Scrape urls, write the new prices back and send any threshold alerts they raised.
+
+    Returns the number of products updated. With raise_errors, a RuntimeError
+    is raised (after the failures are recorded) when no URL could be scraped.
+    """
+    updates = []
+    failed = []
+    for url, data, source in fetch_products(urls, price_only=True):
+        if data:
+            title, price, rating = data[0][:3]
+            updates.append((url, price, rating, source, title))
+        else:
+            failed.append(url)
+    updated = update_product_prices(updates, failed, REFRESH_RETRY_BASE, max(REFRESH_RETRY_BASE, REFRESH_INTERVAL))
+    if updated:
+        send_alerts()
+    elif raise_errors and failed:
+        raise RuntimeError(f"Could not refresh any of {len(failed)} products")
+    return updated
+
+
+def send_alerts():
+    try:
+        return dispatch_pending()
+    except Exception as e:
+        print(f"Error dispatching alerts: {e}")
+        return 0
+
+
+class RefreshJob:
+    """Progress of one price refresh request"""
+
+    def __init__(self, urls, user_id=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.total = len(urls)
+        self.updated = 0
+        self.failed = 0
+        self.pending_batches = 0
+        # Queue job ids of batches handed to worker.py processes
+        self.queue_ids = []
+        self.status = "queued"
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "updated": self.updated,
+            "failed": self.failed,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class RefreshScheduler:
+    """Runs price refreshes on a bounded worker pool, off the request path.
+
+    submit() splits a list of URLs into batches that are scraped by
+    fetch_products and written back with one transaction per batch. With
+    use_queue the batches go to the durable job queue instead and are run
+    by worker.py processes; job progress is read back from the queue.
+    start() additionally runs a background scan that enqueues tracked
+    products whose last_updated is older than their refresh interval.
+    """
+
+    def __init__(self, workers=REFRESH_WORKERS, batch_size=REFRESH_BATCH_SIZE, use_queue=QUEUE_ENABLED):
+        self._use_queue = use_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="price-refresh")
+        self._batch_size = batch_size
+        self._jobs = OrderedDict()
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_compaction = 0
+
+    def submit(self, urls, user_id=None):
+        """Enqueue a refresh of urls and return the job id"""
+        with self._lock:
+            # URLs already queued by another job will be written back by that job
+            urls = [url for url in dict.fromkeys(urls) if url not in self._in_flight]
+            self._in_flight.update(urls)
+            job = RefreshJob(urls, user_id)
+            self._jobs[job.id] = job
+            while len(self._jobs) > MAX_JOB_HISTORY:
+                _, evicted = self._jobs.popitem(last=False)
+                # Queue batches of an evicted job are never synced, so release their URLs here
+                # (thread batches still reach _finish_batch through the executor)
+                for _, batch in evicted.queue_ids:
+                    self._in_flight.difference_update(batch)
+
+            batches = [urls[i:i + self._batch_size] for i in range(0, len(urls), self._batch_size)]
+            job.pending_batches = len(batches)
+            if not batches:
+                job.status = "done"
+                job.finished_at = time.time()
+
+        for batch in batches:
+            if self._use_queue:
+                job.queue_ids.append((job_queue.enqueue("refresh", {"urls": batch}), batch))
+            else:
+                self._executor.submit(self._run_batch, job, batch)
+        return job.id
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None and job.queue_ids:
+            self._sync_queued(job)
+        return job
+
+    def _sync_queued(self, job):
+        """Fold finished queue batches into job's counters"""
+        for queue_id, urls in list(job.queue_ids):
+            queued = job_queue.get(queue_id)
+            if queued is not None and queued["status"] not in FINISHED_STATUSES:
+                if queued["status"] == "running":
+                    with self._lock:
+                        job.status = "running"
+                continue
+            with self._lock:
+                # Another thread may have folded this batch in already
+                if (queue_id, urls) not in job.queue_ids:
+                    continue
+                job.queue_ids.remove((queue_id, urls))
+            result = (queued or {}).get("result") or {}
+            self._finish_batch(job, urls, result.get("updated", 0))
+
+    def sync(self):
+        """Check every job waiting on worker processes"""
+        with self._lock:
+            waiting = [job for job in self._jobs.values() if job.queue_ids]
+        for job in waiting:
+            self._sync_queued(job)
+
+    def _run_batch(self, job, urls):
+        with self._lock:
+            job.status = "running"
+        updated = 0
+        try:
+            updated = refresh_prices(urls)
+        except Exception as e:
+            print(f"Error refreshing prices: {e}")
+        finally:
+            self._finish_batch(job, urls, updated)
+
+    def _finish_batch(self, job, urls, updated):
+        with self._lock:
+            self._in_flight.difference_update(urls)
+            job.updated += updated
+            job.failed += len(urls) - updated
+            job.pending_batches -= 1
+            if job.pending_batches == 0:
+                job.status = "done"
+                job.finished_at = time.time()
+
+    def scan(self):
+        """Enqueue every tracked product that is due for a refresh"""
+        urls = get_due_products(REFRESH_INTERVAL, REFRESH_HOT_INTERVAL, REFRESH_THRESHOLD_MARGIN, REFRESH_SCAN_LIMIT)
+        if urls:
+            return self.submit(urls)
+        return None
+
+    def compact(self):
+        """Roll aged raw price points into daily rollups"""
+        self._last_compaction = time.time()
+        try:
+            if self._use_queue:
+                job_queue.purge()
+            return compact_price_history(HISTORY_RAW_RETENTION, HISTORY_ROLLUP_RETENTION)
+        except Exception as e:
+            print(f"Error compacting price history: {e}")
+            return 0
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+                self.scan()
+            except Exception as e:
+                print(f"Error scanning for due products: {e}")
+            # Retries alerts whose earlier delivery failed
+            send_alerts()
+            if time.time() - self._last_compaction >= HISTORY_COMPACT_EVERY:
+                self.compact()
+            self._stop.wait(REFRESH_POLL_SECONDS)
+
+    def start(self):
+        """Start the periodic background scan"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="refresh-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+
+
+refresh_scheduler = RefreshScheduler()
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from scraper import iter_search_results
+from result_store import result_store, search_key
+from job_queue import job_queue, QUEUE_ENABLED, FINISHED_STATUSES
+
+SCRAPE_JOB_WORKERS = int(os.getenv("SCRAPE_JOB_WORKERS", "4"))
+# Finished jobs are kept this long so late stream readers still get their results
+SCRAPE_JOB_RETENTION = int(os.getenv("SCRAPE_JOB_RETENTION", "900"))
+MAX_SCRAPE_JOBS = 500
+# Idle streams emit a heartbeat this often so proxies keep the connection open
+HEARTBEAT_SECONDS = 15
+# How often a job handed to worker.py processes is checked for completion
+QUEUE_POLL_SECONDS = 1
+
+
+class ScrapeJob:
+    """A search scrape running in the background, with records appended as they arrive"""
+
+    def __init__(self, user_id, platform, query, max_pages=None, max_results=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.platform = platform
+        self.query = query
+        self.max_pages = max_pages
+        self.max_results = max_results
+        self.records = []
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._condition = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "failed")
+
+    def append(self, record):
+        with self._condition:
+            self.records.append(record)
+            self._condition.notify_all()
+
+    def finish(self, status, error=None):
+        with self._condition:
+            self.status = status
+            self.error = error
+            self.finished_at = time.time()
+            self._condition.notify_all()
+
+    def follow(self, heartbeat=HEARTBEAT_SECONDS):
+        """Yield records from the start as they are produced, then stop when the job ends.
+
+        Yields None whenever heartbeat seconds pass without a new record.
+        """
+        index = 0
+        while True:
+            with self._condition:
+                if index >= len(self.records) and not self.finished:
+                    self._condition.wait(heartbeat)
+                pending = self.records[index:]
+                finished = self.finished
+            if pending:
+                index += len(pending)
+                for record in pending:
+                    yield record
+            elif finished:
+                return
+            else:
+                yield None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "error": self.error,
+            "count": len(self.records),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ScrapeJobManager:
+    """Runs search scrapes on a worker pool so HTTP workers return immediately"""
+
+    def __init__(self, workers=SCRAPE_JOB_WORKERS, use_queue=QUEUE_ENABLED):
+        self._use_queue = use_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scrape-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, user_id, search_url, platform, query, max_pages=None, max_results=None):
+        """Start a scrape of search_url for query and return the job"""
+        job = ScrapeJob(user_id, platform, query, max_pages, max_results)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, search_url)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - SCRAPE_JOB_RETENTION
+        for job_id, job in list(self._jobs.items()):
+            if len(self._jobs) <= MAX_SCRAPE_JOBS and (not job.finished or job.finished_at > cutoff):
+                break
+            del self._jobs[job_id]
+
+    def _run(self, job, search_url):
+        job.status = "running"
+        key = search_key(job.platform, job.query, job.max_pages or 1)
+        try:
+            cached = result_store.get(key)
+            if cached is not None:
+                for record in cached[:job.max_results] if job.max_results else cached:
+                    job.append(record)
+            elif self._use_queue:
+                for record in self._run_queued(job, search_url):
+                    job.append(record)
+            else:
+                for record in iter_search_results(search_url, job.query, job.max_pages, job.max_results,
+                                                  raise_errors=True):
+                    job.append(record)
+                # A run cut short by max_results is not the full page set
+                if job.records and not job.max_results:
+                    result_store.put(key, list(job.records))
+            result_store.set_user_results(job.user_id, list(job.records))
+            job.finish("done")
+        except Exception as e:
+            print(f"Error in scrape job {job.id}: {e}")
+            job.finish("failed", str(e))
+
+    def _run_queued(self, job, search_url):
+        """Hand the scrape to a worker process and wait for its records"""
+        queue_id = job_queue.enqueue("search", {
+            "search_url": search_url, "query": job.query,
+            "max_pages": job.max_pages, "max_results": job.max_results,
+        })
+        while True:
+            queued = job_queue.get(queue_id)
+            if queued is None or queued["status"] in FINISHED_STATUSES:
+                break
+            time.sleep(QUEUE_POLL_SECONDS)
+        if queued is None or queued["status"] != "done":
+            raise RuntimeError((queued or {}).get("error") or "Queued scrape was lost")
+        return queued["result"]["records"]
+
+
+scrape_jobs = ScrapeJobManager()
@@ -1,51 +1,241 @@
+import os
+import math
 import time
 import csv
 import json
 import re
+import tempfile
+import threading
+import weakref
 import concurrent.futures
-from functools import lru_cache
-import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from urllib.parse import urlparse
-
-# Load selectors from JSON
-with open("selectors.json", "r") as f:
+from urllib.parse import urlparse, quote_plus
+from driver_pool import DriverPool
+from fetcher import fetch_page, fetch_pages, scan_pages, close_fetcher, PROXY
+from cache import page_cache, normalize_url
+from singleflight import SingleFlight
+from ratelimit import rate_limiter, CAPTCHA_SCAN_BYTES
+from snapshot import extract_products_from_source
+from price_scan import PriceScanner
+from extractors import extract_product, extractor_strategy
+from router import strategy_router
+from metrics import counter, histogram
+from snapshot import EXTRACTION_FAILURES
+
+# Selenium and webdriver-manager are imported by the browser code paths only,
+# so processes that never open a browser start without them
+
+# Load selectors from JSON (found next to the backend directory, whatever the cwd)
+SELECTORS_FILE = os.getenv(
+    "SELECTORS_FILE", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "selectors.json")
+)
+with open(SELECTORS_FILE, "r") as f:
     SELECTORS = json.load(f)
 
-# Global driver instance for reuse
-_driver = None
+# Per-domain politeness settings and captcha markers for the rate limiter
+for _domain, _selectors in SELECTORS.items():
+    rate_limiter.configure(_domain, captcha_markers=_selectors.get("captcha_markers", []),
+                           **_selectors.get("rate_limit", {}))
+
+# How search results are read: "snapshot" parses one page_source copy in-process,
+# "element" queries each WebElement through the driver
+EXTRACTION_MODE = os.getenv("SCRAPER_EXTRACTION_MODE", "snapshot")
+
+# Multi-page search crawling limits
+SEARCH_PAGE_CONCURRENCY = int(os.getenv("SEARCH_PAGE_CONCURRENCY", "4"))
+MAX_SEARCH_PAGES = int(os.getenv("MAX_SEARCH_PAGES", "20"))
+# Rough listings per results page, used to turn max_results into a page count
+RESULTS_PER_PAGE = 20
+
+# Coalesces identical in-flight product scrapes, across worker processes too
+product_flight = SingleFlight("product", cross_process=True)
+
+# Where scraping time goes (driver start, page loads, waits, fetches, parsing)
+# and which path served each scrape
+STAGE_SECONDS = histogram("scraper_stage_seconds", "Time spent in each scraping stage", ("stage", "domain"))
+SCRAPE_PATHS = counter(
+    "scraper_path_total", "Scrapes by kind and the path that served them", ("kind", "domain", "path", "result")
+)
+
+# A fixed chromedriver binary, skipping webdriver-manager entirely
+CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH", "")
+# Where the path webdriver-manager resolved is remembered, so restarts skip its network lookup
+CHROMEDRIVER_CACHE = os.getenv(
+    "CHROMEDRIVER_CACHE", os.path.join(tempfile.gettempdir(), "ecom-scraper-chromedriver.json")
+)
+# Browsers launched in the background when the app or a worker starts
+BROWSER_PRELAUNCH = int(os.getenv("BROWSER_PRELAUNCH", "0"))
+
+# "eager" returns from driver.get once the DOM is ready instead of waiting for every subresource
+PAGE_LOAD_STRATEGY = os.getenv("BROWSER_PAGE_LOAD_STRATEGY", "eager")
+# Skip images, fonts, media and trackers in browser page loads; a domain's
+# "block_profile" in selectors.json adds URL patterns or replaces the types
+BLOCK_RESOURCES = os.getenv("BROWSER_BLOCK_RESOURCES", "1") == "1"
+DEFAULT_BLOCK_PROFILE = {
+    "resource_types": ["image", "font", "media"],
+    "url_patterns": [
+        "*doubleclick.net*", "*googletagmanager.com*", "*google-analytics.com*",
+        "*googlesyndication.com*", "*facebook.net*", "*connect.facebook.com*",
+    ],
+}
+# Network.setBlockedURLs only matches URLs, so resource types are blocked by file extension
+RESOURCE_TYPE_EXTENSIONS = {
+    "image": ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico"],
+    "font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "media": ["mp4", "webm", "m3u8", "mp3", "ogg"],
+}
+
+# Shared pool of WebDriver instances, created on first use
+_pool = None
+_pool_lock = threading.Lock()
+_chromedriver = None
+_chromedriver_lock = threading.Lock()
+# Domain whose block list each live driver currently has
+_blocked_for = weakref.WeakKeyDictionary()
+
+def chromedriver_path(refresh=False):
+    """Path of the chromedriver binary, resolved once and cached on disk.
+
+    CHROMEDRIVER_PATH wins; otherwise the path remembered in CHROMEDRIVER_CACHE
+    is reused while the file exists, and ChromeDriverManager().install() (a
+    network lookup) only runs when there is none or refresh is set.
+    """
+    global _chromedriver
+    if CHROMEDRIVER_PATH:
+        return CHROMEDRIVER_PATH
+    with _chromedriver_lock:
+        if _chromedriver and not refresh:
+            return _chromedriver
+        if not refresh:
+            try:
+                with open(CHROMEDRIVER_CACHE, "r") as f:
+                    cached = json.load(f).get("path")
+                if cached and os.access(cached, os.X_OK):
+                    _chromedriver = cached
+                    return cached
+            except (OSError, ValueError):
+                pass
+
+        from webdriver_manager.chrome import ChromeDriverManager
+        with STAGE_SECONDS.time(stage="driver_install"):
+            _chromedriver = ChromeDriverManager().install()
+        try:
+            temp_path = f"{CHROMEDRIVER_CACHE}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"path": _chromedriver, "resolved_at": time.time()}, f)
+            os.replace(temp_path, CHROMEDRIVER_CACHE)
+        except OSError as e:
+            print(f"Error caching chromedriver path: {e}")
+        return _chromedriver
 
 def get_driver():
-    """Get or create a WebDriver instance"""
-    global _driver
-    if _driver is None:
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64)")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        
-        service = Service(ChromeDriverManager().install())
-        _driver = webdriver.Chrome(service=service, options=chrome_options)
-    return _driver
+    """Launch a new headless Chrome WebDriver instance (used as the pool factory)"""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64)")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    if PROXY:
+        chrome_options.add_argument(f"--proxy-server={PROXY}")
+    chrome_options.page_load_strategy = PAGE_LOAD_STRATEGY
+    if BLOCK_RESOURCES and "image" in DEFAULT_BLOCK_PROFILE["resource_types"]:
+        # Images are never read; not decoding them also saves renderer memory
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+
+    path = chromedriver_path()
+    try:
+        with STAGE_SECONDS.time(stage="driver_start"):
+            return webdriver.Chrome(service=Service(path), options=chrome_options)
+    except Exception:
+        if CHROMEDRIVER_PATH:
+            raise
+        # The cached driver may no longer match the installed Chrome
+        fresh = chromedriver_path(refresh=True)
+        if fresh == path:
+            raise
+        with STAGE_SECONDS.time(stage="driver_start"):
+            return webdriver.Chrome(service=Service(fresh), options=chrome_options)
+
+def block_patterns(domain):
+    """URL patterns to block while a browser loads pages of domain"""
+    override = SELECTORS.get(domain, {}).get("block_profile", {})
+    if not BLOCK_RESOURCES or override.get("enabled") is False:
+        return []
+    resource_types = override.get("resource_types", DEFAULT_BLOCK_PROFILE["resource_types"])
+    patterns = DEFAULT_BLOCK_PROFILE["url_patterns"] + override.get("url_patterns", [])
+    for resource_type in resource_types:
+        for extension in RESOURCE_TYPE_EXTENSIONS.get(resource_type, []):
+            patterns += [f"*.{extension}", f"*.{extension}?*"]
+    return list(dict.fromkeys(patterns))
+
+def apply_block_profile(driver, domain):
+    """Install domain's block list on driver through the DevTools protocol, once per domain change"""
+    if _blocked_for.get(driver) == domain:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": block_patterns(domain)})
+    except Exception as e:
+        # Drivers without CDP support just load everything
+        print(f"Error applying block profile for {domain}: {e}")
+    _blocked_for[driver] = domain
+
+def load_page(driver, url, domain):
+    """Navigate a leased driver to url with the domain's block list applied.
+
+    Callers take a rate_limiter token before leasing the driver, so a browser
+    isn't held while waiting for one. A captcha page raises (see check_page).
+    """
+    apply_block_profile(driver, domain)
+    with STAGE_SECONDS.time(stage="page_load", domain=domain):
+        driver.get(url)
+    check_page(driver, url, domain)
+
+def check_page(driver, url, domain):
+    """Report the rendered page to the rate limiter; raises if it is a captcha page.
+
+    Only the head of the DOM that the captcha check reads is copied out of
+    the browser, not the whole page source. The browser doesn't expose the
+    status code, so a rendered page counts as a 200.
+    """
+    head = driver.execute_script(
+        "return document.documentElement.outerHTML.slice(0, arguments[0]);", CAPTCHA_SCAN_BYTES
+    )
+    if rate_limiter.observe(url, 200, head or ""):
+        raise RuntimeError(f"Blocked by {domain} while loading {url}")
+
+def get_driver_pool():
+    """Get or create the shared WebDriver pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DriverPool(get_driver)
+    return _pool
+
+def lease_driver(timeout=None):
+    """Lease a WebDriver from the shared pool: `with lease_driver() as driver:`"""
+    return get_driver_pool().lease(timeout)
+
+def driver_pool_stats():
+    """Occupancy of the shared driver pool, or None before any browser was needed"""
+    pool = _pool
+    return pool.stats() if pool is not None else None
 
 def close_driver():
-    """Close the WebDriver instance when done"""
-    global _driver
-    if _driver:
-        _driver.quit()
-        _driver = None
+    """Quit all pooled WebDriver instances"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
 
 def get_domain(url):
     """Returns the e-commerce domain (amazon, flipkart) based on the URL."""
@@ -57,60 +247,191 @@ def get_domain(url):
     else:
         return None
 
-def scrape_ecom(url, search_query):
-    """Scrapes product details from Amazon or Flipkart based on the URL."""
+def scrape_ecom(url, search_query, max_pages=None, max_results=None, raise_errors=False):
+    """Scrapes product details from Amazon or Flipkart based on the URL.
+
+    With max_pages or max_results, the paginated search URLs are crawled
+    concurrently (see iter_search_results) instead of typing into the
+    search box and reading the first results page.
+
+    Failures return [] like a search without matches, unless raise_errors
+    is set, in which case a RuntimeError tells the caller to retry.
+    """
+    if max_pages or max_results:
+        return list(iter_search_results(url, search_query, max_pages, max_results, raise_errors))
+
     domain = get_domain(url)
     if not domain or domain not in SELECTORS:
         print("Unsupported domain. Only Amazon and Flipkart are supported.")
+        if raise_errors:
+            raise RuntimeError(f"Unsupported domain: {url}")
         return []
 
-    driver = get_driver()
     products = []
     
     try:
-        driver.get(url)
-        
-        # Wait for search box to be present instead of sleeping
-        search_box_xpath = SELECTORS[domain]["search_box"]
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, search_box_xpath))
-        )
-
-        # Perform search
-        search_box = driver.find_element(By.XPATH, search_box_xpath)
-        search_box.clear()
-        search_box.send_keys(search_query)
-        search_box.send_keys(Keys.RETURN)
-        
-        # Wait for results to load instead of sleeping
-        product_container_xpath = SELECTORS[domain]["container"]
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, product_container_xpath))
-        )
-
-        # Extract product details
-        product_elements = driver.find_elements(By.XPATH, product_container_xpath)
-        
-        # Use thread pool for parallel processing of product elements
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            futures = []
-            for product in product_elements:
-                futures.append(
-                    executor.submit(extract_product_data, product, domain)
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        rate_limiter.acquire(url)
+        with lease_driver() as driver:
+            load_page(driver, url, domain)
+            
+            # Wait for search box to be present instead of sleeping
+            search_box_xpath = SELECTORS[domain]["search_box"]
+            with STAGE_SECONDS.time(stage="wait", domain=domain):
+                WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, search_box_xpath))
                 )
+
+            # Perform search
+            search_box = driver.find_element(By.XPATH, search_box_xpath)
+            search_box.clear()
+            search_box.send_keys(search_query)
+            # Submitting loads the results page, which is a request of its own
+            rate_limiter.acquire(url)
+            search_box.send_keys(Keys.RETURN)
             
-            for future in concurrent.futures.as_completed(futures):
-                result = future.result()
-                if result:
-                    products.append(result)
+            # Wait for results to load instead of sleeping
+            product_container_xpath = SELECTORS[domain]["container"]
+            try:
+                with STAGE_SECONDS.time(stage="wait", domain=domain):
+                    WebDriverWait(driver, 10).until(
+                        EC.presence_of_element_located((By.XPATH, product_container_xpath))
+                    )
+            finally:
+                # A captcha page instead of results also ends the wait (by timing out)
+                check_page(driver, driver.current_url, domain)
+
+            if EXTRACTION_MODE == "snapshot":
+                # Grab the rendered DOM once and hand the browser back to the pool
+                page_source = driver.page_source
+                base_url = driver.current_url
+            else:
+                # Extract product details
+                extract_started = time.time()
+                product_elements = driver.find_elements(By.XPATH, product_container_xpath)
+                
+                # Use thread pool for parallel processing of product elements
+                with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+                    futures = []
+                    for product in product_elements:
+                        futures.append(
+                            executor.submit(extract_product_data, product, domain)
+                        )
+                    
+                    for future in concurrent.futures.as_completed(futures):
+                        result = future.result()
+                        if result:
+                            products.append(result)
+                STAGE_SECONDS.observe(time.time() - extract_started, stage="extract", domain=domain)
 
+        if EXTRACTION_MODE == "snapshot":
+            with STAGE_SECONDS.time(stage="extract", domain=domain):
+                products = extract_products_from_source(page_source, SELECTORS[domain], base_url, domain)
+
+        SCRAPE_PATHS.inc(kind="search", domain=domain, path="browser", result="ok" if products else "empty")
         return products
     except Exception as e:
         print(f"Error in scrape_ecom: {e}")
+        SCRAPE_PATHS.inc(kind="search", domain=domain, path="browser", result="error")
+        if raise_errors:
+            raise RuntimeError(f"Search for {search_query!r} failed: {e}") from e
         return []
 
+def pages_for_results(max_results):
+    """Number of search pages needed for max_results listings"""
+    return min(MAX_SEARCH_PAGES, max(1, math.ceil(max_results / RESULTS_PER_PAGE)))
+
+def build_search_url(domain, search_query, page):
+    """Build the URL of one page of search results for a query"""
+    return SELECTORS[domain]["search_url"].format(query=quote_plus(search_query), page=page)
+
+def scrape_search_page(domain, page_url):
+    """Scrape one results page: static HTTP first, a leased browser if that yields nothing"""
+    with STAGE_SECONDS.time(stage="static_fetch", domain=domain):
+        fetched = fetch_page(page_url)
+    if not fetched.error and fetched.status == 200 and fetched.text:
+        with STAGE_SECONDS.time(stage="static_parse", domain=domain):
+            products = extract_products_from_source(fetched.text, SELECTORS[domain], page_url, domain)
+        if products:
+            SCRAPE_PATHS.inc(kind="search_page", domain=domain, path="static", result="ok")
+            return products
+
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+
+    rate_limiter.acquire(page_url)
+    with lease_driver() as driver:
+        load_page(driver, page_url, domain)
+        with STAGE_SECONDS.time(stage="wait", domain=domain):
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.XPATH, SELECTORS[domain]["container"]))
+            )
+        page_source = driver.page_source
+        base_url = driver.current_url
+    with STAGE_SECONDS.time(stage="extract", domain=domain):
+        products = extract_products_from_source(page_source, SELECTORS[domain], base_url, domain)
+    SCRAPE_PATHS.inc(kind="search_page", domain=domain, path="browser", result="ok" if products else "empty")
+    return products
+
+def iter_search_results(url, search_query, max_pages=None, max_results=None, raise_errors=False):
+    """Yields [title, price, rating, url] records from several search pages.
+
+    Pages are fetched concurrently and records are yielded as soon as each
+    page completes, de-duplicated by normalized product URL. Stops after
+    max_results records when given. Pages that fail are skipped; with
+    raise_errors, a RuntimeError is raised at the end if every page failed.
+    """
+    domain = get_domain(url)
+    if not domain or domain not in SELECTORS:
+        print("Unsupported domain. Only Amazon and Flipkart are supported.")
+        if raise_errors:
+            raise RuntimeError(f"Unsupported domain: {url}")
+        return
+
+    if not max_pages:
+        max_pages = pages_for_results(max_results) if max_results else 1
+    page_urls = [build_search_url(domain, search_query, page) for page in range(1, max_pages + 1)]
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(len(page_urls), SEARCH_PAGE_CONCURRENCY))
+    future_to_url = {executor.submit(scrape_search_page, domain, page_url): page_url for page_url in page_urls}
+    seen = set()
+    count = 0
+    errors = []
+    try:
+        for future in concurrent.futures.as_completed(future_to_url):
+            try:
+                products = future.result()
+            except Exception as e:
+                print(f"Error scraping search page {future_to_url[future]}: {e}")
+                errors.append(e)
+                continue
+
+            for product in products:
+                key = normalize_url(product[3]) if product[3] else None
+                if key is not None:
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                yield product
+                count += 1
+                if max_results and count >= max_results:
+                    return
+        if raise_errors and len(errors) == len(page_urls):
+            raise RuntimeError(f"All {len(page_urls)} search pages for {search_query!r} failed: {errors[0]}")
+    finally:
+        # Pages still queued are not needed once the caller stops iterating
+        executor.shutdown(wait=False, cancel_futures=True)
+
 def extract_product_data(product_element, domain):
     """Extract data from a product element - used for parallel processing"""
+    from selenium.webdriver.common.by import By
+
+    field = "title"
     try:
         title_xpath = SELECTORS[domain]["title"]
         price_xpath = SELECTORS[domain]["price"]
@@ -118,6 +439,7 @@ def extract_product_data(product_element, domain):
         url_xpath = SELECTORS[domain]["url"]
 
         title = product_element.find_element(By.XPATH, title_xpath).text
+        field = "price"
         price = product_element.find_element(By.XPATH, price_xpath).text
         
         # Try to get rating, but don't fail if not available
@@ -126,119 +448,366 @@ def extract_product_data(product_element, domain):
         except:
             rating = "N/A"
             
+        field = "url"
         url_element = product_element.find_element(By.XPATH, url_xpath)
         url = url_element.get_attribute("href")
 
         return [title, price, rating, url]
     except Exception as e:
         print(f"Error extracting product data: {e}")
+        EXTRACTION_FAILURES.inc(domain=domain, field=field)
         return None
 
-# Cache results for 1 hour (3600 seconds)
-@lru_cache(maxsize=128)
-def scrape_product_cached(url, timestamp=None):
-    """Cached version of scrape_product with a timestamp for cache invalidation"""
-    return scrape_product_actual(url)
-
 def scrape_product(url):
-    """Wrapper that uses the cached version but invalidates cache after an hour"""
-    # Round to nearest hour for cache efficiency while still refreshing hourly
-    timestamp = int(time.time()) // 3600
-    return scrape_product_cached(url, timestamp)
+    """Scrapes a product through the shared persistent cache.
+
+    Fresh entries are returned without any network access; stale entries are
+    revalidated with a conditional request so an unchanged page costs a 304.
+    """
+    domain = get_domain(url)
+    if not domain or domain not in SELECTORS:
+        print("Unsupported domain. Only Amazon and Flipkart are supported.")
+        return []
+
+    key = normalize_url(url)
+    entry = page_cache.get(key)
+    if entry and entry.fresh:
+        SCRAPE_PATHS.inc(kind="product", domain=domain, path="cache", result="ok")
+        return entry.value
+
+    # Concurrent misses for the same product (in this process or another) share one fetch
+    return product_flight.do(
+        key,
+        lambda: refresh_product(url, domain, key, entry),
+        recheck=lambda: fresh_cached_product(key)
+    )
+
+def fresh_cached_product(key):
+    """Return the cached product for key if it is still fresh, else None.
+
+    Used as the single-flight recheck after scrape_product's own lookup was
+    counted, so this one is not; a hit here shows up as "rechecked" instead.
+    """
+    entry = page_cache.get(key, count=False)
+    return entry.value if entry and entry.fresh else None
+
+def refresh_product(url, domain, key, entry=None):
+    """Fetch a product (revalidating a stale cache entry) and store the result"""
+    data, fetched = scrape_product_page(url, domain, page_cache.conditional_headers(entry))
+    if data is None and entry is not None:
+        # 304 Not Modified: the cached product is still current
+        page_cache.touch(key, domain)
+        return entry.value
+
+    if data:
+        store_product(key, data, domain, fetched)
+    return data or []
+
+def store_product(key, data, domain, fetched=None):
+    """Cache product data along with the validators of the response it came from"""
+    etag = last_modified = None
+    if fetched is not None:
+        etag = fetched.headers.get("etag")
+        last_modified = fetched.headers.get("last-modified")
+    page_cache.set(key, data, domain, etag, last_modified)
+
+def parse_product_page(html, domain, strategies=None):
+    """Parse a statically fetched product page with the extractor chain.
+
+    Returns (data, strategy of the extractor that matched), or (None, None).
+    """
+    data, name = extract_product(html, SELECTORS[domain], strategies)
+    return data, extractor_strategy(name) if data else None
+
+def parse_fetch_result(result, domain, strategies=("structured", "static"), started=None):
+    """Turn a FetchResult into product data, or None if the static path failed.
+
+    Only extractors of the given router strategies run, and the outcome of
+    each one tried is reported to the router.
+    """
+    data = hit = None
+    if result.error:
+        print(f"Static fetch failed for {result.url}: {result.error}")
+    elif result.status == 200:
+        try:
+            with STAGE_SECONDS.time(stage="static_parse", domain=domain):
+                data, hit = parse_product_page(result.text, domain, strategies)
+        except Exception as e:
+            print(f"Static extraction failed for {result.url}: {e}")
+    record_static_outcome(domain, result.url, strategies, hit, started)
+    return data
+
+def record_static_outcome(domain, url, strategies, hit, started=None):
+    """Report HTTP strategies tried up to the one that succeeded (hit), if any"""
+    latency = time.time() - started if started else None
+    for strategy in strategies:
+        strategy_router.record(domain, url, strategy, strategy == hit, latency)
+        if strategy == hit:
+            break
+
+def http_strategies(domain, url):
+    """The router's HTTP strategies for url; empty when it should go straight to the browser"""
+    return [strategy for strategy in strategy_router.plan(domain, url) if strategy != "browser"]
 
 def scrape_product_actual(url):
-    """Scrapes a single product, with a hybrid approach using requests+BS4 first"""
+    """Scrapes a single product, with a hybrid approach using pooled HTTP+extractors first"""
     domain = get_domain(url)
     if not domain or domain not in SELECTORS:
         print("Unsupported domain. Only Amazon and Flipkart are supported.")
         return []
     
-    # Try with requests+BeautifulSoup first (faster)
-    try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=5)
-        
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Extract based on domain
-            if domain == 'amazon':
-                title = soup.select_one('#productTitle').text.strip() if soup.select_one('#productTitle') else ""
-                # Try different price selectors
-                price_element = soup.select_one('.a-price .a-offscreen')
-                price = price_element.text.strip() if price_element else ""
-                rating_element = soup.select_one('#acrPopover .a-icon-alt')
-                rating = rating_element.text.strip() if rating_element else "N/A"
-                
-                if title and price:
-                    return [[title, price, rating]]
-                    
-            elif domain == 'flipkart':
-                title = soup.select_one('.B_NuCI').text.strip() if soup.select_one('.B_NuCI') else ""
-                price_element = soup.select_one('._30jeq3')
-                price = price_element.text.strip() if price_element else ""
-                rating_element = soup.select_one('._2d4LTz')
-                rating = rating_element.text.strip() if rating_element else "N/A"
-                
-                if title and price:
-                    return [[title, price, rating]]
-    
-    except Exception as e:
-        print(f"BS4 approach failed, falling back to Selenium: {e}")
-    
-    # Fall back to Selenium if BS4 approach failed
-    driver = get_driver()
+    data, _ = scrape_product_page(url, domain)
+    return data
+
+def scrape_product_page(url, domain, headers=None):
+    """Fetch and parse a product page, falling back to the browser.
+
+    Returns (data, fetch_result). data is None when a conditional request
+    came back 304; fetch_result is None when the data came from the browser.
+    """
+    # Try the pooled HTTP client + structured data/selectors first (faster),
+    # unless the router has seen those fail for this kind of page
+    strategies = http_strategies(domain, url)
+    if strategies:
+        started = time.time()
+        with STAGE_SECONDS.time(stage="static_fetch", domain=domain):
+            fetched = fetch_page(url, headers)
+        if headers and fetched.status == 304:
+            SCRAPE_PATHS.inc(kind="product", domain=domain, path="static", result="not_modified")
+            return None, fetched
+
+        data = parse_fetch_result(fetched, domain, strategies, started)
+        if data:
+            SCRAPE_PATHS.inc(kind="product", domain=domain, path="static", result="ok")
+            return data, fetched
     
+    return scrape_product_browser(url, domain), None
+
+def scrape_product_browser(url, domain):
+    """Scrapes a single product page with a leased Selenium driver"""
+    started = time.time()
+    data = _scrape_product_browser(url, domain)
+    strategy_router.record(domain, url, "browser", bool(data), time.time() - started)
+    STAGE_SECONDS.observe(time.time() - started, stage="browser_scrape", domain=domain)
+    SCRAPE_PATHS.inc(kind="product", domain=domain, path="browser", result="ok" if data else "empty")
+    return data
+
+def _scrape_product_browser(url, domain):
     try:
-        driver.get(url)
-        
-        # Wait for the product title to be present
-        title_xpath = SELECTORS[domain]["product_title"]
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, title_xpath))
-        )
-
-        # Extract product details
-        title = driver.find_element(By.XPATH, title_xpath).text
-        
-        try:
-            price_xpath = SELECTORS[domain]["product_price"]
-            price = driver.find_element(By.XPATH, price_xpath).text
-            if price == '' and domain == 'amazon':
-                price = driver.execute_script("return document.querySelector('.a-price .a-offscreen')?.innerText;")
-        except:
-            price = "N/A"
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        rate_limiter.acquire(url)
+        with lease_driver() as driver:
+            load_page(driver, url, domain)
             
-        try:
-            rating_xpath = SELECTORS[domain]["product_rating"]
-            rating = driver.find_element(By.XPATH, rating_xpath).text
-        except:
-            rating = "N/A"
+            # Wait for the product title to be present
+            title_xpath = SELECTORS[domain]["product_title"]
+            with STAGE_SECONDS.time(stage="wait", domain=domain):
+                WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, title_xpath))
+                )
+
+            # Extract product details
+            title = driver.find_element(By.XPATH, title_xpath).text
+            
+            try:
+                price_xpath = SELECTORS[domain]["product_price"]
+                price = driver.find_element(By.XPATH, price_xpath).text
+                if price == '' and domain == 'amazon':
+                    price = driver.execute_script("return document.querySelector('.a-price .a-offscreen')?.innerText;")
+            except:
+                price = "N/A"
+                EXTRACTION_FAILURES.inc(domain=domain, field="product_price")
+                
+            try:
+                rating_xpath = SELECTORS[domain]["product_rating"]
+                rating = driver.find_element(By.XPATH, rating_xpath).text
+            except:
+                rating = "N/A"
+                EXTRACTION_FAILURES.inc(domain=domain, field="product_rating")
 
         return [[title, price, rating]]
     except Exception as e:
         print(f"Error in scrape_product: {e}")
         return []
 
+def fetch_products(urls, price_only=False):
+    """Scrape many product URLs: concurrent static fetches, browser fallback for misses.
+
+    Returns a list of (url, data, source) tuples in input order; data is []
+    when the product could not be scraped and source names the path that
+    produced it ("stream", "static", "revalidated" or "browser").
+
+    Products with cached ETag/Last-Modified validators are requested
+    conditionally; a 304 returns the cached data ("revalidated") and extends
+    its cache entry.
+
+    With price_only, bodies are streamed through the domain's price_patterns
+    and each download stops as soon as the price and rating are found. Such
+    results may lack a title, and are only written to the product cache
+    when they have one.
+    """
+    unique_urls = list(dict.fromkeys(urls))
+    results = {}
+    fallback = []
+
+    supported = {}
+    for url in unique_urls:
+        domain = get_domain(url)
+        if domain not in SELECTORS:
+            results[url] = ([], None)
+            continue
+        strategies = http_strategies(domain, url)
+        if strategies:
+            supported[url] = strategies
+        else:
+            fallback.append(url)
+    cached = cached_validators(supported)
+
+    if price_only:
+        # Pages the scan could not resolve go straight to the browser
+        with STAGE_SECONDS.time(stage="stream_scan", domain="all"):
+            fallback += scan_product_prices(supported, results, cached)
+        supported = {}
+
+    with STAGE_SECONDS.time(stage="batch_fetch", domain="all"):
+        fetched_pages = fetch_pages(list(supported), url_headers=cached_headers(cached)) if supported else []
+    for fetched in fetched_pages:
+        domain = get_domain(fetched.url)
+        if revalidated(fetched, cached, results):
+            continue
+        data = parse_fetch_result(fetched, domain, supported[fetched.url])
+        if data:
+            results[fetched.url] = (data, "static")
+            store_product(normalize_url(fetched.url), data, domain, fetched)
+        else:
+            fallback.append(fetched.url)
+
+    # Only as many browser scrapes as there are pooled drivers can run at once
+    if fallback:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=get_driver_pool().size) as executor:
+            future_to_url = {
+                executor.submit(scrape_product_browser, url, get_domain(url)): url for url in fallback
+            }
+            for future in concurrent.futures.as_completed(future_to_url):
+                url = future_to_url[future]
+                try:
+                    data = future.result()
+                    results[url] = (data, "browser")
+                    if data:
+                        store_product(normalize_url(url), data, get_domain(url))
+                except Exception as e:
+                    print(f"Error processing {url}: {e}")
+                    results[url] = ([], None)
+
+    for url, (data, source) in results.items():
+        if source:
+            SCRAPE_PATHS.inc(kind="batch", domain=get_domain(url), path=source, result="ok" if data else "empty")
+    return [(url,) + results[url] for url in urls]
+
+def cached_validators(urls):
+    """Map each url with a cached copy that has ETag/Last-Modified to its (key, entry)"""
+    cached = {}
+    for url in urls:
+        key = normalize_url(url)
+        # Batches always go to the network, so this lookup is not a cache hit or miss
+        entry = page_cache.get(key, count=False)
+        if entry is not None and page_cache.conditional_headers(entry):
+            cached[url] = (key, entry)
+    return cached
+
+def cached_headers(cached):
+    """Per-URL conditional request headers for fetch_pages/scan_pages"""
+    return {url: page_cache.conditional_headers(entry) for url, (key, entry) in cached.items()}
+
+def revalidated(fetched, cached, results):
+    """Serve a 304 Not Modified from the cached copy it revalidated; returns whether it did"""
+    if fetched.error or fetched.status != 304 or fetched.url not in cached:
+        return False
+    key, entry = cached[fetched.url]
+    page_cache.touch(key, get_domain(fetched.url))
+    results[fetched.url] = (entry.value, "revalidated")
+    return True
+
+def scan_product_prices(urls, results, cached=None):
+    """Stream urls for their prices, filling results; returns the urls left for the browser.
+
+    urls maps each url to its router strategies and cached to the (key,
+    entry) of those with validators, which are requested conditionally. A
+    page whose download finished without a pattern match is parsed in full
+    from the text already read instead of being fetched again.
+    """
+    cached = cached or {}
+    scans = [(url, PriceScanner(SELECTORS[get_domain(url)].get("price_patterns", {}))) for url in urls]
+    unresolved = []
+    for (url, scanner), fetched in zip(scans, scan_pages(scans, url_headers=cached_headers(cached))):
+        domain = get_domain(url)
+        if revalidated(fetched, cached, results):
+            continue
+        data = scanner.product() if not fetched.error and fetched.status == 200 else None
+        if data:
+            # The price patterns are selector rules, so a match counts for "static"
+            record_static_outcome(domain, url, ["static"], "static")
+            results[url] = (data, "stream")
+            if data[0][0]:
+                # Keep the validators so the next refresh can be a conditional request
+                store_product(normalize_url(url), data, domain, fetched)
+            continue
+        if scanner.done or fetched.error or fetched.status != 200:
+            record_static_outcome(domain, url, urls[url], None)
+        else:
+            data = parse_fetch_result(fetched, domain, urls[url])
+            if data:
+                results[url] = (data, "static")
+                store_product(normalize_url(url), data, domain, fetched)
+                continue
+        unresolved.append(url)
+    return unresolved
+
+def scrape_products(urls):
+    """Scrape many products at once, answering fresh ones from the product cache.
+
+    Returns {url: data} with data [] for products that could not be scraped.
+    """
+    results = {}
+    misses = []
+    for url in dict.fromkeys(urls):
+        cached = fresh_cached_product(normalize_url(url)) if get_domain(url) in SELECTORS else None
+        if cached:
+            results[url] = cached
+        else:
+            misses.append(url)
+    for url, data, _ in fetch_products(misses):
+        results[url] = data
+    return results
+
 def update_prices_batch(urls):
     """Update prices for multiple URLs in parallel"""
-    results = []
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        future_to_url = {executor.submit(scrape_product, url): url for url in urls}
-        for future in concurrent.futures.as_completed(future_to_url):
-            url = future_to_url[future]
-            try:
-                data = future.result()
-                results.append((url, data))
-            except Exception as e:
-                print(f"Error processing {url}: {e}")
-                results.append((url, None))
-    
-    return results
+    return [(url, data) for url, data, _ in fetch_products(urls)]
+
+def warm_up_drivers(count=None):
+    """Pre-launch pooled browsers so the first scrapes don't pay Chrome startup"""
+    return get_driver_pool().warm_up(count)
+
+def prelaunch_drivers(count=BROWSER_PRELAUNCH):
+    """Warm up count browsers on a background thread; returns the thread, or None for count 0"""
+    if count <= 0:
+        return None
+
+    def run():
+        try:
+            warm_up_drivers(count)
+        except Exception as e:
+            print(f"Error pre-launching browsers: {e}")
+
+    thread = threading.Thread(target=run, name="driver-prelaunch", daemon=True)
+    thread.start()
+    return thread
 
 # Make sure to call this when your application shuts down
 def cleanup():
-    close_driver()
\ No newline at end of file
+    close_driver()
+    close_fetcher()
+    strategy_router.flush()
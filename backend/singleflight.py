@@ -0,0 +1,106 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalesce within the process only
+    fcntl = None
+
+LOCK_DIR = os.getenv("SINGLEFLIGHT_LOCK_DIR", os.path.join(tempfile.gettempdir(), "ecom-scraper-locks"))
+# Keys are hashed onto this many lock files so the lock table never grows
+LOCK_STRIPES = int(os.getenv("SINGLEFLIGHT_LOCK_STRIPES", "4096"))
+
+
+class _Call:
+    """An in-flight call that followers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    Within a process, callers that arrive while a call for their key is in
+    flight wait for it and receive its result (or exception). With
+    cross_process=True the leader also holds an flock on a striped lock file,
+    so a leader in another worker process waits for the first one to finish
+    and then runs recheck() (typically a shared-cache lookup) before doing
+    the work itself.
+    """
+
+    def __init__(self, name, cross_process=False, lock_dir=LOCK_DIR):
+        self._name = name
+        self._lock_dir = lock_dir if cross_process and fcntl is not None else None
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "executions": 0, "collapsed": 0, "cross_process_waits": 0, "rechecked": 0}
+        if self._lock_dir:
+            os.makedirs(self._lock_dir, exist_ok=True)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def do(self, key, fn, recheck=None):
+        """Return fn() for key, sharing one execution among concurrent callers"""
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self._stats["collapsed"] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._execute(key, fn, recheck)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _execute(self, key, fn, recheck):
+        if self._lock_dir is None:
+            self._count("executions")
+            return fn()
+
+        digest = hashlib.sha1(f"{self._name}:{key}".encode("utf-8")).hexdigest()
+        path = os.path.join(self._lock_dir, f"{self._name}-{int(digest, 16) % LOCK_STRIPES}.lock")
+        with open(path, "a") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another process is fetching this key: wait, then reuse its result if it cached one
+                self._count("cross_process_waits")
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                if recheck is not None:
+                    value = recheck()
+                    if value is not None:
+                        self._count("rechecked")
+                        fcntl.flock(handle, fcntl.LOCK_UN)
+                        return value
+            try:
+                self._count("executions")
+                return fn()
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
@@ -0,0 +1,70 @@
+from urllib.parse import urljoin
+from metrics import counter
+
+EXTRACTION_FAILURES = counter(
+    "scraper_extraction_failures_total", "Listings or product pages where a selector matched nothing", ("domain", "field")
+)
+
+# Compiled XPath expressions, keyed by the expression string
+_compiled = {}
+
+
+def _xpath(expression):
+    """Compile an XPath expression once and reuse it across pages"""
+    compiled = _compiled.get(expression)
+    if compiled is None:
+        from lxml import etree
+
+        compiled = etree.XPath(expression)
+        _compiled[expression] = compiled
+    return compiled
+
+
+def _first(node, expression):
+    matches = _xpath(expression)(node)
+    return matches[0] if matches else None
+
+
+def _text(element):
+    """Whitespace-normalized text of an element, like WebElement.text"""
+    return " ".join(element.text_content().split())
+
+
+def parse_page(page_source):
+    """Parse an HTML document into an lxml tree"""
+    from lxml import html
+
+    return html.fromstring(page_source)
+
+
+def extract_products_from_source(page_source, selectors, base_url=None, domain=""):
+    """Extract [title, price, rating, url] records from a results page snapshot.
+
+    Evaluates the same container/title/price/rating/url XPaths from
+    selectors.json that extract_product_data uses, but against an in-process
+    tree so a whole page costs one page_source round-trip to the browser.
+    """
+    tree = parse_page(page_source)
+    products = []
+
+    for container in _xpath(selectors["container"])(tree):
+        title_element = _first(container, selectors["title"])
+        price_element = _first(container, selectors["price"])
+        url_element = _first(container, selectors["url"])
+        if title_element is None or price_element is None or url_element is None:
+            for field, element in (("title", title_element), ("price", price_element), ("url", url_element)):
+                if element is None:
+                    EXTRACTION_FAILURES.inc(domain=domain, field=field)
+            continue
+
+        rating_element = _first(container, selectors["rating"])
+        rating = _text(rating_element) if rating_element is not None else "N/A"
+
+        # WebElement.get_attribute("href") returns an absolute URL
+        url = url_element.get("href")
+        if url and base_url:
+            url = urljoin(base_url, url)
+
+        products.append([_text(title_element), _text(price_element), rating, url])
+
+    return products
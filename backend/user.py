@@ -1,15 +1,27 @@
 import sqlite3
 import bcrypt
 import jwt
-from datetime import datetime, timedelta
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 import os
+from connections import get_connection, transaction
 
+logger = logging.getLogger(__name__)
+
+USERS_DATABASE = "users.db"
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')  # Use environment variable in production
 
+# Verified token payloads keyed by token digest, so repeat requests skip decoding
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '4096'))
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+
 def get_db_connection():
-    conn = sqlite3.connect("users.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_connection(USERS_DATABASE)
 
 def init_db():
     conn = get_db_connection()
@@ -27,7 +39,6 @@ def init_db():
     ''')
     
     conn.commit()
-    conn.close()
 
 def register_user(name, email, password):
     conn = get_db_connection()
@@ -36,7 +47,6 @@ def register_user(name, email, password):
     # Check if user already exists
     cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
     if cursor.fetchone():
-        conn.close()
         return False, "Email already registered"
     
     # Hash password
@@ -44,16 +54,14 @@ def register_user(name, email, password):
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
     
     try:
-        cursor.execute(
-            "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
-            (name, email, hashed_password.decode('utf-8'))
-        )
-        conn.commit()
+        with transaction(USERS_DATABASE) as conn:
+            cursor = conn.execute(
+                "INSERT INTO users (name, email, password) VALUES (?, ?, ?)",
+                (name, email, hashed_password.decode('utf-8'))
+            )
         user_id = cursor.lastrowid
-        conn.close()
         return True, {"message": "Registration successful", "user_id": user_id}
     except Exception as e:
-        conn.close()
         return False, str(e)
 
 def login_user(email, password):
@@ -63,7 +71,6 @@ def login_user(email, password):
     # Get user
     cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
     user = cursor.fetchone()
-    conn.close()
     
     if not user:
         return False, "User not found"
@@ -73,7 +80,7 @@ def login_user(email, password):
         return False, "Invalid password"
     
     # Set expiration time
-    exp_time = datetime.utcnow() + timedelta(days=1)
+    exp_time = datetime.now(timezone.utc) + timedelta(days=1)
     
     # Generate JWT token
     token_payload = {
@@ -85,14 +92,10 @@ def login_user(email, password):
     
     try:
         token = jwt.encode(token_payload, SECRET_KEY, algorithm='HS256')
-        print(f"Generated token (first 10 chars): {token[:10]}...")
-        
-        # Testing token verification
-        test_success, test_payload = verify_token(token)
-        if not test_success:
-            print(f"WARNING: Generated token fails verification: {test_payload}")
-        else:
-            print(f"Token verification successful")
+        logger.debug("token issued user_id=%s", user['id'])
+
+        # The payload is known to be valid, so the session's first request can skip decoding
+        _cache_token(token, dict(token_payload, exp=int(exp_time.timestamp())))
             
         return True, {
             "token": token,
@@ -103,29 +106,61 @@ def login_user(email, password):
             }
         }
     except Exception as e:
-        print(f"Error generating token: {str(e)}")
+        logger.error("token generation failed error=%s", e)
         return False, f"Authentication error: {str(e)}"
 
+def _token_digest(token):
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+def _cache_token(token, payload):
+    """Remember a verified payload until its exp claim"""
+    if 'exp' not in payload:
+        return
+    with _token_cache_lock:
+        _token_cache[_token_digest(token)] = payload
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+def _cached_token(token):
+    """Return (hit, payload) from the verification cache, dropping expired entries"""
+    digest = _token_digest(token)
+    with _token_cache_lock:
+        payload = _token_cache.get(digest)
+        if payload is None:
+            return False, None
+        if payload['exp'] <= time.time():
+            del _token_cache[digest]
+            return True, None
+        _token_cache.move_to_end(digest)
+        return True, payload
+
 def verify_token(token):
+    hit, payload = _cached_token(token)
+    if hit:
+        if payload is None:
+            logger.debug("token expired (cached)")
+            return False, "Token has expired"
+        return True, payload
+
     try:
-        print(f"Attempting to decode token (first 10 chars): {token[:10]}...")
         payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
         
         # Verify required claims are present
         if 'user_id' not in payload:
-            print(f"Token missing required claim 'user_id': {payload}")
+            logger.debug("token missing claim=user_id")
             return False, "Invalid token: missing user_id claim"
             
-        print(f"Token successfully decoded for user_id: {payload['user_id']}")
+        logger.debug("token decoded user_id=%s", payload['user_id'])
+        _cache_token(token, payload)
         return True, payload
     except jwt.ExpiredSignatureError:
-        print("Token expired")
+        logger.debug("token expired")
         return False, "Token has expired"
     except jwt.InvalidTokenError as e:
-        print(f"Invalid token error: {str(e)}")
+        logger.debug("token invalid error=%s", e)
         return False, f"Invalid token: {str(e)}"
     except Exception as e:
-        print(f"Unexpected error in token verification: {str(e)}")
+        logger.warning("token verification failed error=%s", e)
         return False, f"Token verification failed: {str(e)}"
 
 def get_user_by_id(user_id):
@@ -135,7 +170,6 @@ def get_user_by_id(user_id):
     
     cursor.execute("SELECT id, name, email, created_at FROM users WHERE id = ?", (user_id,))
     user = cursor.fetchone()
-    conn.close()
     
     if not user:
         return None
@@ -143,9 +177,6 @@ def get_user_by_id(user_id):
 
 def update_user_profile(user_id, name=None, email=None, password=None):
     """Update user profile information"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
         updates = []
         params = []
@@ -167,27 +198,20 @@ def update_user_profile(user_id, name=None, email=None, password=None):
         
         params.append(user_id)
         query = f"UPDATE users SET {', '.join(updates)} WHERE id = ?"
-        cursor.execute(query, params)
-        conn.commit()
+        with transaction(USERS_DATABASE) as conn:
+            conn.execute(query, params)
         return True, "Profile updated successfully"
     except sqlite3.IntegrityError:
         return False, "Email already exists"
     except Exception as e:
         return False, str(e)
-    finally:
-        conn.close()
 
 def delete_user(user_id):
     """Delete a user and all their tracked products"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    with transaction(USERS_DATABASE) as conn:
+        cursor = conn.cursor()
         # Delete user's tracked products first (due to foreign key constraint)
         cursor.execute("DELETE FROM tracked_products WHERE user_id = ?", (user_id,))
         # Delete the user
         cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
-        conn.commit()
-        return cursor.rowcount > 0
-    finally:
-        conn.close()
\ No newline at end of file
+    return cursor.rowcount > 0
\ No newline at end of file
@@ -0,0 +1,153 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+from job_queue import job_queue, VISIBILITY_TIMEOUT
+
+# Standalone scrape worker: pulls "search" and "refresh" jobs from the SQLite
+# job queue and runs them on this process's own driver pool and HTTP client,
+# independently of the web tier. Run several per machine, or on several nodes
+# sharing the queue file:  python worker.py --processes 4 --threads 2
+
+# Idle workers poll the queue this often
+POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1"))
+# Leases are extended this often while a job runs
+HEARTBEAT_SECONDS = max(1, VISIBILITY_TIMEOUT // 3)
+# Dead worker processes are restarted at most this often
+RESTART_DELAY = 5
+
+
+def run_search(payload):
+    from scraper import scrape_ecom
+    # A failed scrape raises so the queue retries it instead of storing no results
+    records = scrape_ecom(payload["search_url"], payload["query"],
+                          payload.get("max_pages"), payload.get("max_results"), raise_errors=True)
+    return {"records": records}
+
+
+def run_refresh(payload):
+    from scheduler import refresh_prices
+    return {"updated": refresh_prices(payload["urls"], raise_errors=True)}
+
+
+HANDLERS = {
+    "search": run_search,
+    "refresh": run_refresh,
+}
+
+
+class Worker:
+    """Runs queue jobs on a few threads inside one process"""
+
+    def __init__(self, threads, kinds=None):
+        self._threads = threads
+        self._kinds = list(kinds or HANDLERS)
+        self._stop = threading.Event()
+        self._active = {}
+        self._lock = threading.Lock()
+        self._prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def stop(self, *args):
+        self._stop.set()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            with self._lock:
+                active = list(self._active.items())
+            for job_id, worker_id in active:
+                try:
+                    job_queue.heartbeat(job_id, worker_id)
+                except Exception as e:
+                    print(f"Error extending lease for job {job_id}: {e}")
+
+    def _run_job(self, job, worker_id):
+        with self._lock:
+            self._active[job.id] = worker_id
+        try:
+            result = HANDLERS[job.kind](job.payload)
+        except Exception as e:
+            status = job_queue.fail(job.id, worker_id, e)
+            print(f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}, now {status}: {e}")
+        else:
+            job_queue.complete(job.id, worker_id, result)
+        finally:
+            with self._lock:
+                self._active.pop(job.id, None)
+
+    def _thread_loop(self, index):
+        worker_id = f"{self._prefix}:{index}"
+        while not self._stop.is_set():
+            try:
+                job = job_queue.lease(worker_id, self._kinds)
+            except Exception as e:
+                print(f"Error leasing job: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(POLL_SECONDS)
+                continue
+            self._run_job(job, worker_id)
+
+    def run(self):
+        """Process jobs until stop() is called, then release browsers and connections"""
+        threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True).start()
+        threads = [
+            threading.Thread(target=self._thread_loop, args=(i,), name=f"job-worker-{i}")
+            for i in range(self._threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        from scraper import cleanup
+        cleanup()
+
+
+def worker_main(threads, kinds):
+    from scraper import prelaunch_drivers
+    prelaunch_drivers()
+    worker = Worker(threads, kinds)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
+
+
+def supervise(processes, threads, kinds):
+    """Keep processes worker processes running, restarting any that die"""
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stopping.set())
+    signal.signal(signal.SIGINT, lambda *args: stopping.set())
+
+    def spawn():
+        process = multiprocessing.Process(target=worker_main, args=(threads, kinds), daemon=False)
+        process.start()
+        return process
+
+    children = [spawn() for _ in range(processes)]
+    while not stopping.wait(RESTART_DELAY):
+        for i, process in enumerate(children):
+            if not process.is_alive():
+                print(f"Worker process {process.pid} exited with {process.exitcode}, restarting")
+                children[i] = spawn()
+
+    for process in children:
+        if process.is_alive():
+            process.terminate()
+    for process in children:
+        process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run scrape workers against the job queue")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=int(os.getenv("DRIVER_POOL_SIZE", "2")),
+                        help="jobs run concurrently per process (defaults to the driver pool size)")
+    parser.add_argument("--kinds", nargs="*", choices=sorted(HANDLERS), help="only run these job kinds")
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        worker_main(args.threads, args.kinds)
+    else:
+        supervise(args.processes, args.threads, args.kinds)
@@ -0,0 +1,267 @@
+import argparse
+import concurrent.futures
+import contextlib
+import datetime
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from server import start_server, add_server_arguments, server_options
+
+# Offline benchmarks for the scraping paths, run against bench/server.py
+# instead of the live sites. Writes one JSON report per run:
+#   python bench/run.py --requests 200 --latency-ms 30 --output results.json
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+BACKEND_DIR = os.path.join(REPO_DIR, "backend")
+
+SCENARIOS = ("search", "product_static", "product_browser", "refresh_batch", "refresh_stream")
+HOSTS = {"amazon": "www.amazon.in", "flipkart": "www.flipkart.com"}
+SEARCH_PATHS = {"amazon": "/s?k={query}&page={page}", "flipkart": "/search?q={query}&page={page}"}
+PRODUCT_PATHS = {"amazon": "/bench-{name}-{index}/dp/{key}", "flipkart": "/bench-{name}-{index}/p/{key}"}
+# The stand-in server is local, so the per-domain politeness limits only add idle time
+BENCH_RATE_LIMIT = {"initial_rps": 10000, "min_rps": 10000, "max_rps": 10000, "burst": 10000}
+
+
+def prepare_environment(args, proxy_url, workdir):
+    """Point the scraper at the fixture server before it is imported.
+
+    The selectors are copied with http:// search URLs (the server cannot
+    intercept HTTPS) and, unless --polite, without the rate limits; every
+    SQLite file and lock lands in workdir.
+    """
+    with open(os.path.join(REPO_DIR, "selectors.json"), "r") as f:
+        selectors = json.load(f)
+    for domain, config in selectors.items():
+        config["search_url"] = "http://" + HOSTS[domain] + SEARCH_PATHS[domain]
+        if not args.polite:
+            config["rate_limit"] = BENCH_RATE_LIMIT
+    selectors_file = os.path.join(workdir, "selectors.json")
+    with open(selectors_file, "w") as f:
+        json.dump(selectors, f)
+
+    os.environ.update({
+        "SCRAPER_PROXY": proxy_url,
+        "SELECTORS_FILE": selectors_file,
+        "SINGLEFLIGHT_LOCK_DIR": os.path.join(workdir, "locks"),
+        "FETCH_HTTP2": "0",
+    })
+    if not args.polite:
+        os.environ["RATE_LIMIT_INITIAL_RPS"] = str(BENCH_RATE_LIMIT["initial_rps"])
+        os.environ["RATE_LIMIT_MAX_RPS"] = str(BENCH_RATE_LIMIT["max_rps"])
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def product_urls(name, count, domains):
+    """count product URLs no earlier scenario has seen, alternating between domains"""
+    urls = []
+    for index in range(count):
+        domain = domains[index % len(domains)]
+        path = PRODUCT_PATHS[domain].format(name=name.replace("_", "-"), index=index, key=f"BENCH{index:05d}")
+        urls.append("http://" + HOSTS[domain] + path)
+    return urls
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+def measure(operation, inputs, concurrency, trace):
+    """Run operation over inputs on concurrency threads and summarize the timings.
+
+    operation returns (items, ok). Latency is per operation; throughput is
+    operations (and items) per second of wall time.
+    """
+    latencies = []
+    items = errors = 0
+
+    def timed(value):
+        started = time.perf_counter()
+        try:
+            result = operation(value)
+        except Exception as e:
+            print(f"Error in benchmark operation: {e}", file=sys.stderr)
+            result = (0, False)
+        return time.perf_counter() - started, result
+
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for latency, (count, ok) in executor.map(timed, inputs):
+            latencies.append(latency)
+            items += count
+            errors += 0 if ok else 1
+    wall = time.perf_counter() - started
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "operations": len(latencies),
+        "items": items,
+        "errors": errors,
+        "wall_seconds": round(wall, 4),
+        "throughput_ops": round(len(latencies) / wall, 2) if wall else None,
+        "throughput_items": round(items / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            **{
+                name: round(percentile(latencies, fraction) * 1000, 2) if latencies else None
+                for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+            },
+        },
+        "peak_traced_kb": round(peak / 1024, 1) if peak is not None else None,
+        # Process-wide high-water mark, so it only ever grows across scenarios
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def bench_search(scraper, args):
+    queries = [(args.domains[i % len(args.domains)], f"bench query {i}") for i in range(args.searches)]
+
+    def operation(value):
+        domain, query = value
+        records = scraper.scrape_ecom(f"http://{HOSTS[domain]}/", query, max_pages=args.search_pages)
+        return len(records), bool(records)
+
+    return measure(operation, queries, 1, args.tracemalloc)
+
+
+def bench_product_static(scraper, args):
+    def operation(url):
+        data = scraper.scrape_product_actual(url)
+        return len(data or []), bool(data)
+
+    return measure(operation, product_urls("product_static", args.requests, args.domains),
+                   args.concurrency, args.tracemalloc)
+
+
+def bench_product_browser(scraper, args):
+    try:
+        launched = scraper.warm_up_drivers(1)
+    except Exception as e:
+        launched = 0
+        print(f"Error launching Chrome: {e}", file=sys.stderr)
+    if not launched:
+        return {"skipped": "Chrome/chromedriver could not be started"}
+
+    def operation(url):
+        data = scraper.scrape_product_browser(url, scraper.get_domain(url))
+        return len(data or []), bool(data)
+
+    urls = product_urls("product_browser", args.browser_requests, args.domains)
+    return measure(operation, urls, min(args.concurrency, scraper.get_driver_pool().size), args.tracemalloc)
+
+
+def _batches(name, args):
+    urls = product_urls(name, args.batches * args.batch_size, args.domains)
+    return [urls[i:i + args.batch_size] for i in range(0, len(urls), args.batch_size)]
+
+
+def bench_refresh_batch(scraper, args):
+    def operation(urls):
+        results = scraper.update_prices_batch(urls)
+        found = sum(1 for _, data in results if data)
+        return found, found == len(urls)
+
+    return measure(operation, _batches("refresh_batch", args), 1, args.tracemalloc)
+
+
+def bench_refresh_stream(scraper, args):
+    def operation(urls):
+        results = scraper.fetch_products(urls, price_only=True)
+        found = sum(1 for _, data, _ in results if data)
+        return found, found == len(urls)
+
+    return measure(operation, _batches("refresh_stream", args), 1, args.tracemalloc)
+
+
+BENCHMARKS = {
+    "search": bench_search,
+    "product_static": bench_product_static,
+    "product_browser": bench_product_browser,
+    "refresh_batch": bench_refresh_batch,
+    "refresh_stream": bench_refresh_stream,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against local fixture pages")
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--domains", nargs="*", choices=sorted(HOSTS), default=sorted(HOSTS))
+    parser.add_argument("--requests", type=int, default=200, help="single-product scrapes (static path)")
+    parser.add_argument("--browser-requests", type=int, default=20, help="single-product scrapes (Selenium path)")
+    parser.add_argument("--concurrency", type=int, default=8, help="threads issuing single-product scrapes")
+    parser.add_argument("--searches", type=int, default=10)
+    parser.add_argument("--search-pages", type=int, default=3, help="result pages crawled per search")
+    parser.add_argument("--batches", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--polite", action="store_true", help="keep the per-domain rate limits from selectors.json")
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false",
+                        help="skip tracemalloc (it slows Python code down noticeably)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    options = server_options(args)
+    server = start_server(**options)
+    workdir = tempfile.mkdtemp(prefix="scraper-bench-")
+    prepare_environment(args, server.url, workdir)
+
+    report = {
+        "meta": {
+            "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "server": options,
+            "args": {name: value for name, value in vars(args).items() if name not in options},
+        },
+        "scenarios": {},
+    }
+    # The scraper reports failures on stdout; keep it free for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        import scraper
+        try:
+            for name in args.scenarios:
+                print(f"Running {name}...", file=sys.stderr)
+                report["scenarios"][name] = BENCHMARKS[name](scraper, args)
+        finally:
+            scraper.cleanup()
+    report["server_responses"] = server.stats()
+    server.shutdown()
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
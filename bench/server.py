@@ -0,0 +1,225 @@
+import argparse
+import os
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from urllib.parse import urlsplit, parse_qs, quote
+
+# Stand-in for amazon.in and flipkart.com used by the offline benchmarks.
+# The scraper reaches it as an HTTP proxy (SCRAPER_PROXY), so product and
+# search URLs keep their real host names and domain detection still works:
+#   python server.py --port 8765 --latency-ms 50 --captcha-rate 0.02
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+DEFAULT_OPTIONS = {
+    # Fixed delay before every response, plus up to jitter_ms more
+    "latency_ms": 0.0,
+    "jitter_ms": 0.0,
+    # Fractions of requests answered with a 503, a 429 (with Retry-After) or a captcha page
+    "error_rate": 0.0,
+    "throttle_rate": 0.0,
+    "captcha_rate": 0.0,
+    # Filler markup added to every page, so bodies are about as large as the real ones
+    "padding_kb": 256,
+    "results_per_page": 20,
+    "seed": 0,
+}
+
+FILLER_LINE = '<div class="a-section nav-filler" data-row="{}"><span class="a-size-base">filler</span></div>\n'
+
+
+def _load(name):
+    with open(os.path.join(FIXTURE_DIR, name), "r", encoding="utf-8") as f:
+        return Template(f.read())
+
+
+TEMPLATES = {
+    name: _load(name + ".html")
+    for name in ("amazon_search", "amazon_search_item", "amazon_product",
+                 "flipkart_search", "flipkart_search_item", "flipkart_product")
+}
+CAPTCHA_PAGE = _load("captcha.html").template.encode("utf-8")
+
+_fillers = {}
+
+
+def filler(kb):
+    """About kb kilobytes of inert markup, built once per size"""
+    if kb not in _fillers:
+        lines = []
+        size = 0
+        while size < kb * 1024:
+            lines.append(FILLER_LINE.format(len(lines)))
+            size += len(lines[-1])
+        _fillers[kb] = "".join(lines)
+    return _fillers[kb]
+
+
+def product_id(*parts):
+    """Stable 10-character id for a listing, like an ASIN"""
+    return "B0" + format(zlib.crc32("/".join(map(str, parts)).encode("utf-8")), "08X")
+
+
+def product_fields(key):
+    """Deterministic title, price and rating for a product id"""
+    checksum = zlib.crc32(key.encode("utf-8"))
+    price = 199 + checksum % 99800
+    return {
+        "title": f"Bench Product {key}",
+        "price": f"{price:,}",
+        "raw_price": str(price),
+        "rating": f"{3 + (checksum >> 8) % 21 / 10:.1f}",
+        "reviews": str(checksum % 50000),
+    }
+
+
+def render_search(domain, query, page, results_per_page, padding_kb):
+    items = []
+    for index in range(1, results_per_page + 1):
+        asin = product_id(domain, query, page, index)
+        fields = product_fields(asin)
+        items.append(TEMPLATES[domain + "_search_item"].substitute(
+            fields, asin=asin, index=index, slug=quote(f"bench-{query}-{index}".replace(" ", "-"))
+        ))
+    return TEMPLATES[domain + "_search"].substitute(
+        query=query, results="\n".join(items), padding=filler(padding_kb)
+    )
+
+
+def render_product(domain, key, padding_kb):
+    # Most of a real product page comes after the price block
+    head_kb = padding_kb // 8
+    return TEMPLATES[domain + "_product"].substitute(
+        product_fields(key), head_padding=filler(head_kb), tail_padding=filler(padding_kb - head_kb)
+    )
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Serves fixture pages with injected latency, errors and captchas"""
+
+    daemon_threads = True
+
+    def __init__(self, address, **options):
+        super().__init__(address, FixtureHandler)
+        self.options = dict(DEFAULT_OPTIONS, **options)
+        self._random = random.Random(self.options["seed"])
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def roll(self):
+        with self._lock:
+            return self._random.random(), self._random.random()
+
+    def count(self, status):
+        with self._lock:
+            self._stats[status] = self._stats.get(status, 0) + 1
+
+    def stats(self):
+        """Responses served so far, by status ("captcha" counted separately)"""
+        with self._lock:
+            return {str(status): count for status, count in sorted(self._stats.items(), key=str)}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_CONNECT(self):
+        # HTTPS cannot be intercepted; the benchmark rewrites URLs to http://
+        self._send(405, b"CONNECT is not supported, use http:// URLs\n", "text/plain")
+
+    def do_GET(self):
+        options = self.server.options
+        fault, jitter = self.server.roll()
+        delay = options["latency_ms"] + jitter * options["jitter_ms"]
+        if delay:
+            time.sleep(delay / 1000)
+
+        if fault < options["error_rate"]:
+            return self._send(503, b"Service Unavailable\n", "text/plain")
+        fault -= options["error_rate"]
+        if fault < options["throttle_rate"]:
+            return self._send(429, b"Too Many Requests\n", "text/plain", {"Retry-After": "1"})
+        fault -= options["throttle_rate"]
+        if fault < options["captcha_rate"]:
+            # Sites answer bot checks with a normal 200 page
+            return self._send(200, CAPTCHA_PAGE, status_key="captcha")
+
+        parts = urlsplit(self.path)
+        host = parts.netloc or self.headers.get("Host", "")
+        domain = "flipkart" if "flipkart" in host else "amazon"
+        query = parse_qs(parts.query)
+        path = parts.path
+
+        if path in ("/s", "/search"):
+            search = (query.get("k") or query.get("q") or [""])[0]
+            try:
+                page = max(1, int((query.get("page") or ["1"])[0]))
+            except ValueError:
+                page = 1
+            body = render_search(domain, search, page, options["results_per_page"], options["padding_kb"])
+        elif "/dp/" in path or "/p/" in path:
+            key = (query.get("pid") or [path.rstrip("/").split("/")[-1]])[0]
+            body = render_product(domain, key, options["padding_kb"])
+        else:
+            return self._send(404, b"Not Found\n", "text/plain")
+        self._send(200, body.encode("utf-8"))
+
+    def _send(self, status, body, content_type="text/html; charset=utf-8", headers=None, status_key=None):
+        self.server.count(status_key or status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """Start a FixtureServer on a background thread; port 0 picks a free one"""
+    server = FixtureServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    return server
+
+
+def add_server_arguments(parser):
+    """Fault-injection and page-size options, shared with run.py"""
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_OPTIONS["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=DEFAULT_OPTIONS["jitter_ms"])
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_OPTIONS["error_rate"])
+    parser.add_argument("--throttle-rate", type=float, default=DEFAULT_OPTIONS["throttle_rate"])
+    parser.add_argument("--captcha-rate", type=float, default=DEFAULT_OPTIONS["captcha_rate"])
+    parser.add_argument("--padding-kb", type=int, default=DEFAULT_OPTIONS["padding_kb"])
+    parser.add_argument("--results-per-page", type=int, default=DEFAULT_OPTIONS["results_per_page"])
+    parser.add_argument("--seed", type=int, default=DEFAULT_OPTIONS["seed"])
+
+
+def server_options(args):
+    return {name: getattr(args, name) for name in DEFAULT_OPTIONS}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Amazon/Flipkart fixture pages for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = FixtureServer((args.host, args.port), **server_options(args))
+    print(f"Serving fixtures on {server.url}; point SCRAPER_PROXY at it")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -33,6 +33,50 @@ async function handleApiResponse(response) {
     return response.json();
 }
 
+// Add one product row (with its Track button) to the results table
+function appendResultRow(resultsTable, product) {
+    const row = resultsTable.insertRow();
+    row.innerHTML = `
+        <td>${product.title || "N/A"}</td>
+        <td>${product.price || "N/A"}</td>
+        <td>${product.rating || "N/A"}</td>
+        <td>
+            <button class="track-btn" data-url="${product.url || ''}" >
+                Track
+            </button>
+        </td>
+    `;
+
+    row.querySelector('.track-btn').addEventListener('click', function () {
+        const productUrl = this.getAttribute('data-url');
+        // Auto-fill the tracking form
+        document.getElementById("trackProductUrl").value = productUrl;
+        // Scroll to the tracking form
+        document.getElementById("trackProductUrl").scrollIntoView({ behavior: "smooth" });
+    });
+}
+
+// Read an NDJSON stream line by line, calling onMessage for each parsed object
+async function readNdjson(response, onMessage) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => onMessage(JSON.parse(line)));
+    }
+    if (buffer.trim()) {
+        onMessage(JSON.parse(buffer));
+    }
+}
+
 async function searchProducts() {
     console.log("searching products....")
     const query = document.getElementById("searchQuery").value.trim();
@@ -56,8 +100,8 @@ async function searchProducts() {
     console.log("Sending request with data:", requestData);
 
     try {
-        // Send POST request to the API
-        const response = await fetch("http://127.0.0.1:5000/scrape", {
+        // Start a background scrape job; the server responds immediately with its id
+        const response = await fetch("http://127.0.0.1:5000/scrape_jobs", {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
@@ -66,18 +110,8 @@ async function searchProducts() {
             body: JSON.stringify(requestData)
         });
 
-        console.log("Received response:", response);
-
-        const data = await handleApiResponse(response);
-        console.log("Received data:", data);
-
-        // Clear loading text
-        resultsTable.innerHTML = "";
-
-        if (data.length === 0) {
-            resultsTable.innerHTML = "<tr><td colspan='4'>No results found.</td></tr>";
-            return;
-        }
+        const job = await handleApiResponse(response);
+        console.log("Started scrape job:", job);
 
         // Update the table header to include a Track column if it doesn't exist
         const tableHeader = document.getElementById("resultsTable").getElementsByTagName("thead")[0];
@@ -86,51 +120,68 @@ async function searchProducts() {
             headerCell.textContent = "Actions";
         }
 
-        // Populate table with results
-        data.forEach(product => {
-            const row = resultsTable.insertRow();
-            row.innerHTML = `
-                <td>${product.title || "N/A"}</td>
-                <td>${product.price || "N/A"}</td>
-                <td>${product.rating || "N/A"}</td>
-                <td>
-                    <button class="track-btn" data-url="${product.url || ''}" >
-                        Track
-                    </button>
-                </td>
-            `;
+        // Append each product as soon as the server streams it
+        const stream = await fetch(`http://127.0.0.1:5000${job.stream_url}`, {
+            headers: getAuthHeader()
         });
+        if (!stream.ok) {
+            await handleApiResponse(stream);
+        }
 
-        // Add event listeners to all track buttons
-        document.querySelectorAll('.track-btn').forEach(button => {
-            button.addEventListener('click', function () {
-                const productUrl = this.getAttribute('data-url');
-                // Auto-fill the tracking form
-                document.getElementById("trackProductUrl").value = productUrl;
-                // Scroll to the tracking form
-                document.getElementById("trackProductUrl").scrollIntoView({ behavior: "smooth" });
-            });
+        let count = 0;
+        let summary = null;
+        await readNdjson(stream, message => {
+            if (message.type === "product") {
+                if (count === 0) {
+                    resultsTable.innerHTML = "";
+                }
+                appendResultRow(resultsTable, message.data);
+                count++;
+            } else if (message.type === "end") {
+                summary = message.data;
+            }
         });
+
+        if (summary && summary.status === "failed") {
+            throw new Error(summary.error || "Scrape failed");
+        }
+        if (count === 0) {
+            resultsTable.innerHTML = "<tr><td colspan='4'>No results found.</td></tr>";
+        }
     } catch (error) {
         console.error("Error:", error);
         resultsTable.innerHTML = `<tr><td colspan='4' style="color: red;">Error: ${error.message}</td></tr>`;
     }
 }
 
-function downloadData(format) {
-    const timestamp = new Date().getTime();
-    
-    // Create an invisible anchor element
-    const link = document.createElement('a');
-    link.href = `http://127.0.0.1:5000/download?format=${format}&t=${timestamp}`;
-    
-    // Add authorization header
-    link.setAttribute('download', '');
-    
-    // Append to document, click it, and remove it
-    document.body.appendChild(link);
-    link.click();
-    document.body.removeChild(link);
+async function downloadData(format) {
+    try {
+        // Downloads need the auth header, so fetch the stream and save it as a blob
+        const response = await fetch(`http://127.0.0.1:5000/download?format=${format}`, {
+            headers: getAuthHeader()
+        });
+        if (!response.ok) {
+            await handleApiResponse(response);
+        }
+
+        const disposition = response.headers.get("Content-Disposition") || "";
+        const match = disposition.match(/filename="([^"]+)"/);
+        const blob = await response.blob();
+
+        // Create an invisible anchor element
+        const link = document.createElement('a');
+        link.href = URL.createObjectURL(blob);
+        link.setAttribute('download', match ? match[1] : `scraped_data.${format}`);
+        
+        // Append to document, click it, and remove it
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
+        URL.revokeObjectURL(link.href);
+    } catch (error) {
+        console.error("Error downloading data:", error);
+        alert(`Download failed: ${error.message}`);
+    }
 }
 
 async function trackProduct() {
@@ -276,6 +327,8 @@ document.addEventListener("DOMContentLoaded", () => {
 
 document.getElementById("csvDownload")?.addEventListener("click", () => downloadData("csv"));
 document.getElementById("jsonDownload")?.addEventListener("click", () => downloadData("json"));
+document.getElementById("xlsxDownload")?.addEventListener("click", () => downloadData("xlsx"));
+document.getElementById("parquetDownload")?.addEventListener("click", () => downloadData("parquet"));
 
 async function updatePrices() {
     console.log("Updating price....")
@@ -286,9 +339,24 @@ async function updatePrices() {
         });
 
         const data = await handleApiResponse(response);
-        alert(data.message);
+        const job = await waitForPriceUpdate(data.job_id);
+        alert(`Prices updated: ${job.updated} of ${job.total} products`);
         fetchTrackedProducts(); // Refresh list after update
     } catch (error) {
         console.error("Error updating prices:", error);
     }
+}
+
+// Poll the refresh job until the scheduler has written back every batch
+async function waitForPriceUpdate(jobId) {
+    while (true) {
+        const response = await fetch(`http://127.0.0.1:5000/update_prices/${jobId}`, {
+            headers: getAuthHeader()
+        });
+        const job = await handleApiResponse(response);
+        if (job.status === "done") {
+            return job;
+        }
+        await new Promise(resolve => setTimeout(resolve, 2000));
+    }
 }
\ No newline at end of file